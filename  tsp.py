@@ -22,13 +22,13 @@ def main():
     print("\ndist arry")
     print(lkh.dist)
     print("---------------")
-    # print("\ntour")
-    # print(lkh.tour)
+    print("\ntour")
+    print(lkh.tour.to_list(), lkh.get_tour_dist())
     # print("\nids")
     # print(lkh.ids)
-    # lkh.run_lk()
-    # print("\ntour")
-    # print(lkh.tour)
+    lkh.run_lk()
+    print("\ntour")
+    print(lkh.tour.to_list(), lkh.get_tour_dist())
     # lkh.init_adj()
     # lkh.find_adjacent()
     # print("\nadjacent")
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+from tspSolver import Distance, to_solver, prepare
+from construction import nearest_neighbor, greedy_edge, mst_tour, hilbert_tour
+from tspIO import iter_instances
+from tspMain import to_file
+import os, sys, glob, argparse, multiprocessing
+from time import perf_counter
+
+# Usage: python3 batchRunner.py <directory or glob> [--workers N] [--construct C] [--two-opt]
+# A file or instance that fails is listed as FAILED in the summary and the batch goes on,
+# the exit status is then 1.
+
+BUILDERS = {"greedy": greedy_edge, "mst": mst_tour, "hilbert": hilbert_tour}
+
+
+def parse_args(argv):
+    """ This function parses the command line
+    :param:
+        argv (list): Command line arguments without the program name
+    :return:
+        Namespace: parsed options
+    """
+    parser = argparse.ArgumentParser(description="Solve every tsp instance of a directory or glob")
+    parser.add_argument("target", help="directory of instance files, or a glob such as 'graphs/*.txt'")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="worker processes (default: all cores)")
+    parser.add_argument("--construct", choices=["nn", "greedy", "mst", "hilbert"], default="greedy",
+                        help="start tour: nearest neighbor, greedy edge, "
+                             "spanning tree with matching or hilbert curve")
+    parser.add_argument("--two-opt", action="store_true",
+                        help="improve the start tour with neighbor list 2-opt")
+    return parser.parse_args(argv)
+
+
+def find_files(target):
+    """ This function lists the instance files of a directory or glob
+    :param:
+        target (string): Directory or glob pattern
+    :return:
+        list: sorted file names, .tour and .btour output files and hidden files left out
+    """
+    if os.path.isdir(target):
+        names = [os.path.join(target, f) for f in os.listdir(target) if not f.startswith(".")]
+    else:
+        names = glob.glob(target)
+    return sorted(f for f in names if os.path.isfile(f) and not f.endswith((".tour", ".btour")))
+
+
+def iter_jobs(files, construct, two_opt):
+    """ This function streams one job per instance, files are parsed as the pool asks for work
+    :param:
+        files (list): Instance files
+    :param:
+        construct (string): Construction heuristic
+    :param:
+        two_opt (bool): Improve with 2-opt
+    :return:
+        generator: (file, instance number, coords, construct, two_opt, error), error is None
+            unless the file could not be parsed, coords is then None
+    """
+    for f in files:
+        i = 0
+        try:
+            for g in iter_instances(f):
+                yield f, i, g.g, construct, two_opt, None
+                i += 1
+        except Exception as e:
+            # Instances before the bad one are solved, the rest of the file is skipped
+            yield f, i, None, construct, two_opt, "%s: %s" % (type(e).__name__, e)
+
+
+def solve_job(job):
+    """ This function solves one instance
+    :param:
+        job (tuple): (file, instance number, coords, construct, two_opt, error)
+    :return:
+        tuple: (file, instance number, cities, tour, weight, seconds, error),
+            tour and weight are None and error says why if it failed
+    """
+    f, i, coords, construct, two_opt, error = job
+    if error is not None:
+        return f, i, 0, None, None, 0.0, error
+    t1_start = perf_counter()
+    try:
+        g = Distance(len(coords))
+        g.g = coords
+        prepare(g)
+        if construct == "nn":
+            tour, weight = nearest_neighbor(coords, 0, g.dist, g.cand)
+        else:
+            tour, weight = BUILDERS[construct](coords, g.cand, g.dist)
+        if two_opt and len(coords) > 3:
+            tour, weight = to_solver(g).improve(tour, weight)
+    except Exception as e:
+        # One bad instance must not take the pool and the rest of the batch down
+        return f, i, len(coords), None, None, perf_counter() - t1_start, "%s: %s" % (type(e).__name__, e)
+    return f, i, len(coords), tour, weight, perf_counter() - t1_start, None
+
+
+def tour_name(f, i):
+    """ This function names the output of instance i of file f,
+        the first instance keeps the single instance name <file>.tour
+    :param:
+        f (string): Instance file
+    :param:
+        i (int): Instance number in the file
+    :return:
+        string, string: directory, file name
+    """
+    path, name = os.path.split(f)
+    return path, (name + ".tour" if i == 0 else "%s.%d.tour" % (name, i))
+
+
+def run_batch(files, workers=None, construct="greedy", two_opt=False):
+    """ This function solves every instance of files on a process pool.
+        The pool pulls jobs from the parser while it solves, and tours are
+        written here as soon as they come back, so reading, solving and
+        writing overlap.
+    :param:
+        files (list): Instance files
+    :param:
+        workers (int): Worker processes, 1 runs in this process
+            (default is os.cpu_count())
+    :param:
+        construct (string): Construction heuristic
+            (default is "greedy")
+    :param:
+        two_opt (bool): Improve with 2-opt
+            (default is False)
+    :return:
+        list: (file, instance number, cities, weight, seconds, error) per instance, in file order,
+            error is None for a tour written
+    """
+    workers = workers or os.cpu_count() or 1
+    jobs = iter_jobs(files, construct, two_opt)
+    rows = []
+
+    def record(res):
+        f, i, n, tour, weight, secs, error = res
+        if error is None:
+            path, name = tour_name(f, i)
+            try:
+                to_file(name, tour, weight, path)
+            except (OSError, ValueError) as e:
+                error = "%s: %s" % (type(e).__name__, e)
+        rows.append((f, i, n, weight, secs, error))
+
+    if workers <= 1:
+        for job in jobs:
+            record(solve_job(job))
+    else:
+        with multiprocessing.Pool(workers) as pool:
+            for res in pool.imap_unordered(solve_job, jobs):
+                record(res)
+    rows.sort(key=lambda r: (r[0], r[1]))
+    return rows
+
+
+def print_summary(rows, wall):
+    """ This function prints the summary table
+    :param:
+        rows (list): (file, instance number, cities, weight, seconds, error) per instance
+    :param:
+        wall (float): Wall clock time of the batch
+    :return:
+        void
+    """
+    print("%-32s %5s %8s %12s %10s" % ("file", "inst", "n", "length", "seconds"))
+    for f, i, n, weight, secs, error in rows:
+        if error is None:
+            print("%-32s %5d %8d %12d %10.3f" % (os.path.basename(f), i, n, weight, secs))
+        else:
+            print("%-32s %5d %8d %12s %10.3f  %s" % (os.path.basename(f), i, n, "FAILED", secs, error))
+    solve = sum(r[4] for r in rows)
+    failed = sum(1 for r in rows if r[5] is not None)
+    print("%d instances, %d failed, %d cities, solve time %.3f s, wall time %.3f s"
+          % (len(rows), failed, sum(r[2] for r in rows), solve, wall))
+
+
+def main(argv):
+    """ Driver function
+    :param:
+        argv (list): Directory or glob, options
+    :return:
+        int: exit status, 1 if an instance failed
+    """
+    args = parse_args(argv)
+    files = find_files(args.target)
+    if not files:
+        raise FileNotFoundError("No instance files match %s" % args.target)
+    t1_start = perf_counter()
+    rows = run_batch(files, args.workers, args.construct, args.two_opt)
+    print_summary(rows, perf_counter() - t1_start)
+    return 1 if any(r[5] is not None for r in rows) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+from tspSolver import Distance, to_solver, prepare
+from lin_kernighan import LKTsp
+from construction import nearest_neighbor, greedy_edge, mst_tour, hilbert_tour, tour_weight
+from tspIO import iter_instances
+from tour import make_tour
+import localSearch
+import os, io, sys, json, random, argparse, contextlib, tracemalloc
+from time import perf_counter
+
+# Usage: python3 benchmark.py [--update] [--time-tol T] [--length-tol L] [--only NAME]
+# Exit status is 1 when a result regressed against benchmark_baseline.json.
+# Times are machine specific, run with --update on the machine that checks them.
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+BASELINE = os.path.join(ROOT, "benchmark_baseline.json")
+
+# Allowed slow down and length increase, as fractions of the baseline
+TIME_TOL = 0.5
+LENGTH_TOL = 0.0
+
+# Time differences below this many seconds are timer noise, never a regression
+MIN_TIME = 0.05
+
+
+def example_instances():
+    """ Function to load the first instance of example_graphs/tsp_example_0..5
+    :return:
+        list: (name, coords) pairs
+    """
+    out = []
+    for i in range(6):
+        f = os.path.join(ROOT, "example_graphs", "tsp_example_%d.txt" % i)
+        out.append(("tsp_example_%d" % i, next(iter_instances(f)).g))
+    return out
+
+
+def generated_instances():
+    """ Function to generate the seeded synthetic instances
+    :return:
+        list: (name, coords) pairs, uniform and clustered points
+    """
+    rnd = random.Random(2024)
+    uniform = [[rnd.randint(0, 100000), rnd.randint(0, 100000)] for _ in range(1000)]
+    centers = [(rnd.randint(0, 100000), rnd.randint(0, 100000)) for _ in range(20)]
+    clustered = []
+    for _ in range(1000):
+        cx, cy = rnd.choice(centers)
+        clustered.append([int(rnd.gauss(cx, 2000)), int(rnd.gauss(cy, 2000))])
+    return [("uniform_1000", uniform), ("clustered_1000", clustered)]
+
+
+def improve(g, tour, weight, two_opt=True, or_opt=False):
+    """ Function to run the neighbor list improvers on a closed tour
+    :param:
+        g (Distance): Prepared instance
+    :param:
+        tour (list): Closed tour
+    :param:
+        weight (int): Weight of tour
+    :param:
+        two_opt (bool): Run 2-opt
+    :param:
+        or_opt (bool): Run or-opt after 2-opt
+    :return:
+        list, int: improved closed tour, its weight
+    """
+    t = make_tour(tour[:-1])
+    if two_opt:
+        weight -= localSearch.two_opt(t, g.dist, g.cand)
+    if or_opt:
+        weight -= localSearch.or_opt(t, g.dist, g.cand)
+    path = t.to_list()
+    return path + path[:1], weight
+
+
+def lin_kernighan(g, or_opt=False):
+    """ Function to run lk from the seeded random start on the prepared distances
+    :param:
+        g (Distance): Prepared instance
+    :param:
+        or_opt (bool): Interleave or-opt passes
+    :return:
+        list, int: closed tour, its weight
+    """
+    lk = LKTsp(g.get_length())
+    lk.g, lk.dist, lk.cand = g.g, g.dist, g.cand
+    random.seed(0)
+    lk.init_tour()
+    lk.run_lk(or_opt=or_opt)
+    path = lk.tour.to_list()
+    return path + path[:1], lk.get_tour_dist()
+
+
+def multi_start(g):
+    # Solver.run prints its result, keep the table clean
+    with contextlib.redirect_stdout(io.StringIO()):
+        return to_solver(g).run()
+
+
+# name -> function of a prepared instance returning (closed tour, weight)
+METHODS = [
+    ("nn", lambda g: nearest_neighbor(g.g, 0, g.dist, g.cand)),
+    ("nn-multi", multi_start),
+    ("greedy", lambda g: greedy_edge(g.g, g.cand, g.dist)),
+    ("mst", lambda g: mst_tour(g.g, g.cand, g.dist)),
+    ("hilbert", lambda g: hilbert_tour(g.g, g.cand, g.dist)),
+    ("nn+2opt", lambda g: improve(g, *nearest_neighbor(g.g, 0, g.dist, g.cand))),
+    ("greedy+2opt", lambda g: improve(g, *greedy_edge(g.g, g.cand, g.dist))),
+    ("mst+2opt", lambda g: improve(g, *mst_tour(g.g, g.cand, g.dist))),
+    ("hilbert+2opt", lambda g: improve(g, *hilbert_tour(g.g, g.cand, g.dist))),
+    ("greedy+2opt+oropt", lambda g: improve(g, *greedy_edge(g.g, g.cand, g.dist), or_opt=True)),
+    ("lk", lambda g: lin_kernighan(g)),
+    ("lk+oropt", lambda g: lin_kernighan(g, or_opt=True)),
+]
+
+
+def measure(g, method, repeat=1):
+    """ Function to run one method on one instance
+    :param:
+        g (Distance): Prepared instance
+    :param:
+        method (function): Entry of METHODS
+    :param:
+        repeat (int): Timed runs, the fastest counts
+    :return:
+        dict: seconds, peak bytes, length, valid
+    """
+    best = None
+    for _ in range(max(1, repeat)):
+        t1_start = perf_counter()
+        tour, weight = method(g)
+        secs = perf_counter() - t1_start
+        best = secs if best is None else min(best, secs)
+    # Peak memory from a separate run, tracing slows the timed ones down
+    tracemalloc.start()
+    method(g)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    n = g.get_length()
+    valid = sorted(tour[:-1]) == list(range(n)) and int(tour_weight(g.g, tour)) == int(weight)
+    return {"seconds": round(best, 4), "peak_bytes": peak, "length": int(weight), "valid": valid}
+
+
+def run_suite(only=None, repeat=1):
+    """ Function to run every method on every instance
+    :param:
+        only (string): Run only instances or methods containing this
+            (default is None, everything)
+    :param:
+        repeat (int): Timed runs per case
+    :return:
+        dict: "instance/method" -> result of measure
+    """
+    results = {}
+    for name, coords in example_instances() + generated_instances():
+        g = Distance(len(coords))
+        g.g = coords
+        prepare(g)
+        for label, method in METHODS:
+            key = "%s/%s" % (name, label)
+            if only and only not in key:
+                continue
+            results[key] = res = measure(g, method, repeat)
+            print("%-36s %10d %10.4f %12d%s" % (key, res["length"], res["seconds"], res["peak_bytes"],
+                                                "" if res["valid"] else "  INVALID"))
+    return results
+
+
+def compare(results, baseline, time_tol=TIME_TOL, length_tol=LENGTH_TOL):
+    """ Function to list the regressions of results against a baseline
+    :param:
+        results (dict): Output of run_suite
+    :param:
+        baseline (dict): Stored output of run_suite
+    :param:
+        time_tol (float): Allowed slow down, fraction of the baseline time
+    :param:
+        length_tol (float): Allowed length increase, fraction of the baseline length
+    :return:
+        list: one message per regression
+    """
+    bad = []
+    for key, res in sorted(results.items()):
+        if not res["valid"]:
+            bad.append("%s: invalid tour" % key)
+        base = baseline.get(key)
+        if base is None:
+            continue
+        if res["length"] > base["length"] * (1 + length_tol):
+            bad.append("%s: length %d > baseline %d" % (key, res["length"], base["length"]))
+        if res["seconds"] > base["seconds"] * (1 + time_tol) and res["seconds"] - base["seconds"] > MIN_TIME:
+            bad.append("%s: time %.4f s > baseline %.4f s" % (key, res["seconds"], base["seconds"]))
+    return bad
+
+
+def parse_args(argv):
+    """ This function parses the command line
+    :param:
+        argv (list): Command line arguments without the program name
+    :return:
+        Namespace: parsed options
+    """
+    parser = argparse.ArgumentParser(description="Benchmark every constructor and improver")
+    parser.add_argument("--baseline", default=BASELINE, help="baseline json file")
+    parser.add_argument("--update", action="store_true", help="write the results as the new baseline")
+    parser.add_argument("--time-tol", type=float, default=TIME_TOL,
+                        help="allowed slow down as a fraction (default: %(default)s)")
+    parser.add_argument("--length-tol", type=float, default=LENGTH_TOL,
+                        help="allowed tour length increase as a fraction (default: %(default)s)")
+    parser.add_argument("--repeat", type=int, default=1, help="timed runs per case, the fastest counts")
+    parser.add_argument("--only", default=None, help="run only cases whose name contains this")
+    return parser.parse_args(argv)
+
+
+def main(argv):
+    """ Driver function
+    :param:
+        argv (list): Options
+    :return:
+        int: exit status, 1 on a regression
+    """
+    args = parse_args(argv)
+    print("%-36s %10s %10s %12s" % ("case", "length", "seconds", "peak bytes"))
+    results = run_suite(args.only, args.repeat)
+
+    if args.update:
+        baseline = {}
+        if args.only and os.path.isfile(args.baseline):
+            with open(args.baseline, 'r') as r:
+                baseline = json.load(r)
+        baseline.update(results)
+        with open(args.baseline, 'w') as w:
+            json.dump(baseline, w, indent=1, sort_keys=True)
+            w.write("\n")
+        print("Baseline written:", args.baseline)
+        return 0
+
+    if not os.path.isfile(args.baseline):
+        print("No baseline, run with --update first")
+        return 1
+    with open(args.baseline, 'r') as r:
+        baseline = json.load(r)
+    bad = compare(results, baseline, args.time_tol, args.length_tol)
+    for msg in bad:
+        print("REGRESSION", msg)
+    print("%d cases, %d regressions" % (len(results), len(bad)))
+    return 1 if bad else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
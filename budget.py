@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+import signal
+from contextlib import contextmanager
+from time import perf_counter
+
+
+class Budget:
+    """
+    Wall clock budget for the anytime solvers.
+    Construction and improvement loops check expired() between steps and return
+    the best tour they have when it says so. A deadline, or Ctrl-C while
+    catch_sigint() is active, ends the budget.
+    """
+    def __init__(self, seconds=None, deadline=None):
+        if deadline is None and seconds is not None:
+            deadline = perf_counter() + seconds
+        # perf_counter() time to stop at, None for no limit
+        self.deadline = deadline
+        self.interrupted = False
+
+    def expired(self):
+        """ Function to check if the solver should stop
+        :return:
+            bool: True once the deadline passed or SIGINT was caught
+        """
+        return self.interrupted or (self.deadline is not None and perf_counter() >= self.deadline)
+
+    def interrupt(self, signum=None, frame=None):
+        # Signal handler signature, so it can be installed as is
+        self.interrupted = True
+
+    def remaining(self):
+        """ Function to get the time left
+        :return:
+            float: seconds left, None without a deadline
+        """
+        if self.interrupted:
+            return 0.0
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - perf_counter())
+
+    @contextmanager
+    def catch_sigint(self):
+        """ Function to turn the first Ctrl-C into an expired budget, a second one
+            raises KeyboardInterrupt as usual.
+        :return:
+            context manager
+        """
+        def handler(signum, frame):
+            if self.interrupted:
+                raise KeyboardInterrupt
+            self.interrupt()
+
+        try:
+            old = signal.signal(signal.SIGINT, handler)
+        except ValueError:
+            # Not the main thread, signals can't be caught here
+            yield self
+            return
+        try:
+            yield self
+        finally:
+            signal.signal(signal.SIGINT, old)
+
+
+def expired(budget):
+    """ Function to check an optional budget
+    :param:
+        budget (Budget): Budget or None
+    :return:
+        bool: True if budget is set and expired
+    """
+    return budget is not None and budget.expired()
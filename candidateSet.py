@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+import math
+from array import array
+from heapq import heappush, heapreplace
+
+try:
+    import numpy as np
+    from scipy.spatial import cKDTree
+except ImportError:     # scipy is optional, fall back to KDTree below
+    cKDTree = None
+
+
+# Default number of candidate neighbors per city
+CANDIDATES = 10
+
+
+class KDTree:
+    """
+    Implicit 2d tree over a list of [x, y] points.
+    idx holds city ids ordered so the middle of every range is that subtree's root,
+    axis holds the split axis of the root at each position.
+    """
+    def __init__(self, coords):
+        self.coords = coords
+        n = len(coords)
+        self.idx = list(range(n))
+        self.axis = array('b', [0]) * n
+        self.build()
+
+    def build(self):
+        # Per axis coordinate lists, their __getitem__ is the sort key
+        keys = ([x for x, y in self.coords], [y for x, y in self.coords])
+        stack = [(0, len(self.idx))]
+        while stack:
+            lo, hi = stack.pop()
+            if hi - lo < 2:
+                continue
+            sub = self.idx[lo:hi]
+            xs = list(map(keys[0].__getitem__, sub))
+            ys = list(map(keys[1].__getitem__, sub))
+            # Split on the axis with the larger spread
+            ax = 0 if max(xs) - min(xs) >= max(ys) - min(ys) else 1
+            sub.sort(key=keys[ax].__getitem__)
+            self.idx[lo:hi] = sub
+            mid = (lo + hi) // 2
+            self.axis[mid] = ax
+            stack.append((lo, mid))
+            stack.append((mid + 1, hi))
+
+    def query(self, i, k):
+        """ Function to find the k nearest cities to city i, i excluded
+        :param:
+            i (int): City id
+        :param:
+            k (int): Number of neighbors
+        :return:
+            list: (squared distance, city id) pairs, nearest first
+        """
+        if k <= 0:
+            return []
+        coords, idx, axis = self.coords, self.idx, self.axis
+        px, py = coords[i]
+        # Max heap of the k best so far, keyed on -d2
+        best = []
+        stack = [(0, len(idx), 0)]
+        while stack:
+            lo, hi, bound = stack.pop()
+            if lo >= hi or (len(best) == k and bound > -best[0][0]):
+                continue
+            mid = (lo + hi) // 2
+            j = idx[mid]
+            x, y = coords[j]
+            if j != i:
+                d2 = (x-px)**2 + (y-py)**2
+                if len(best) < k:
+                    heappush(best, (-d2, -j))
+                elif d2 < -best[0][0]:
+                    heapreplace(best, (-d2, -j))
+            if hi - lo == 1:
+                continue
+            diff = px - x if axis[mid] == 0 else py - y
+            if diff < 0:
+                near, far = (lo, mid), (mid + 1, hi)
+            else:
+                near, far = (mid + 1, hi), (lo, mid)
+            # Far side is only visited if the splitting line is closer than the worst kept
+            stack.append((far[0], far[1], diff*diff))
+            stack.append((near[0], near[1], 0))
+        return sorted((-d2, -j) for d2, j in best)
+
+
+class CandidateSet:
+    """
+    k nearest neighbors of every city, stored as flat int32 arrays.
+    Neighbors of city i are ids[i*k:(i+1)*k], nearest first, with their
+    rounded distances at the same offsets of dists.
+    """
+    def __init__(self, coords, k=CANDIDATES):
+        self.n = len(coords)
+        self.k = max(0, min(k, self.n - 1))
+        self.ids = array('i')
+        self.dists = array('i')
+        if cKDTree is not None and self.n > 1:
+            self.build_scipy(coords)
+        else:
+            self.build_kdtree(coords)
+
+    @classmethod
+    def from_arrays(cls, n, k, ids, dists):
+        """ Function to rebuild a candidate set from saved ids and dists, nothing is recomputed
+        :param:
+            n (int): Number of cities
+        :param:
+            k (int): Neighbors per city
+        :param:
+            ids (array): n*k neighbor ids
+        :param:
+            dists (array): n*k neighbor distances
+        :return:
+            CandidateSet
+        """
+        cand = cls([], 0)
+        cand.n, cand.k = n, k
+        cand.ids, cand.dists = ids, dists
+        return cand
+
+    def build_kdtree(self, coords):
+        tree = KDTree(coords)
+        sqrt = math.sqrt
+        for i in range(self.n):
+            for d2, j in tree.query(i, self.k):
+                self.ids.append(j)
+                self.dists.append(round(sqrt(d2)))
+
+    def build_scipy(self, coords):
+        n, k = self.n, self.k
+        pts = np.asarray(coords, dtype=np.float64).reshape(n, 2)
+        d, nb = cKDTree(pts).query(pts, k + 1)
+        nb = nb.reshape(n, k + 1)
+        d = d.reshape(n, k + 1)
+        keep = nb != np.arange(n)[:, None]
+        # Duplicate points can push i out of its own row, drop the farthest instead
+        keep[keep.all(axis=1), -1] = False
+        self.ids = array('i', nb[keep].astype(np.int32).tobytes())
+        self.dists = array('i', np.rint(d[keep]).astype(np.int32).tobytes())
+
+    def __len__(self):
+        return self.n
+
+    def neighbors(self, i):
+        """ Function to get the candidate neighbors of a city
+        :param:
+            i (int): City id
+        :return:
+            array: k neighbor ids, nearest first
+        """
+        return self.ids[i*self.k:(i+1)*self.k]
+
+    def neighbor_dists(self, i):
+        """ Function to get the distances to the candidate neighbors of a city
+        :param:
+            i (int): City id
+        :return:
+            array: k distances, same order as neighbors(i)
+        """
+        return self.dists[i*self.k:(i+1)*self.k]
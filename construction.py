@@ -0,0 +1,526 @@
+#!/usr/bin/env python3
+import math
+from array import array
+from heapq import heapify, heappop, heappush
+from euclideanGraph import Set
+from candidateSet import CandidateSet, KDTree
+
+try:
+    import numpy as np
+except ImportError:     # numpy is optional, hilbert_keys falls back to a loop
+    np = None
+
+
+# Hilbert curve order, coordinates are scaled to a 2**order x 2**order grid
+HILBERT_ORDER = 16
+
+
+class NearestTree(KDTree):
+    """
+    2d tree over the cities for nearest unvisited queries.
+    Splits are at medians, so clustered cities get small cells where they are dense.
+    Cities are removed as they get visited, cnt[mid] counts the cities left in the
+    subtree rooted at position mid and empty subtrees are never searched again.
+    """
+    def __init__(self, coords):
+        KDTree.__init__(self, coords)
+        n = len(coords)
+        idx = self.idx
+        # Coordinates and position of every city in tree order
+        self.xs = [coords[c][0] for c in idx]
+        self.ys = [coords[c][1] for c in idx]
+        self.pos = array('i', [0]) * n
+        for p, c in enumerate(idx):
+            self.pos[c] = p
+        self.present = bytearray(b"\x01") * n
+        self.cnt = array('i', [0]) * n
+        stack = [(0, n)]
+        while stack:
+            lo, hi = stack.pop()
+            if lo < hi:
+                self.cnt[(lo + hi) // 2] = hi - lo
+                stack.append((lo, (lo + hi) // 2))
+                stack.append(((lo + hi) // 2 + 1, hi))
+        self.left = n
+
+    def remove(self, c):
+        """ Function to take a city out of the tree, O(log n)
+        :param:
+            c (int): City id
+        :return:
+            void
+        """
+        self.present[c] = 0
+        self.left -= 1
+        p = self.pos[c]
+        cnt = self.cnt
+        lo, hi = 0, len(self.idx)
+        while True:
+            mid = (lo + hi) // 2
+            cnt[mid] -= 1
+            if mid == p:
+                return
+            if p < mid:
+                hi = mid
+            else:
+                lo = mid + 1
+
+    def nearest(self, c, cand=None):
+        """ Function to find the nearest city still in the tree
+        :param:
+            c (int): City id, need not be in the tree
+        :param:
+            cand (CandidateSet): Candidate lists tried first, they hold the nearest cities
+                so a remaining candidate is the answer without a search
+                (default is None)
+        :return:
+            int: nearest remaining city, lowest id on ties without cand, -1 if the tree is empty
+        """
+        if self.left == 0:
+            return -1
+        present = self.present
+        if cand is not None:
+            for j in cand.neighbors(c):
+                if present[j]:
+                    return j
+        idx, axis, cnt, xs, ys = self.idx, self.axis, self.cnt, self.xs, self.ys
+        px, py = self.coords[c]
+        best, best_d = -1, None
+        stack = [(0, len(idx), 0)]
+        while stack:
+            lo, hi, bound = stack.pop()
+            mid = (lo + hi) // 2
+            if lo >= hi or cnt[mid] == 0 or (best_d is not None and bound > best_d):
+                continue
+            x, y = xs[mid], ys[mid]
+            j = idx[mid]
+            if present[j]:
+                d = (x-px)**2 + (y-py)**2
+                if best_d is None or d < best_d or (d == best_d and j < best):
+                    best, best_d = j, d
+            if hi - lo == 1:
+                continue
+            diff = px - x if axis[mid] == 0 else py - y
+            # Far side only if the splitting line is not farther than the best so far
+            if diff < 0:
+                stack.append((mid + 1, hi, diff*diff))
+                stack.append((lo, mid, 0))
+            else:
+                stack.append((lo, mid, diff*diff))
+                stack.append((mid + 1, hi, 0))
+        return best
+
+
+def nearest_neighbor(coords, start=0, dist=None, cand=None):
+    """ Function to build a nearest neighbor tour without recursion
+    :param:
+        coords (list): List of [x, y] points
+    :param:
+        start (int): First city
+            (default is 0)
+    :param:
+        dist: Distance table or provider for the weight, computed from coords if None
+            (default is None)
+    :param:
+        cand (CandidateSet): Candidate lists, tried before searching the tree
+            (default is None)
+    :return:
+        list, int: closed tour (start repeated at the end), weight of the tour
+    """
+    n = len(coords)
+    if n == 0:
+        return [], 0
+    tree = NearestTree(coords)
+    tree.remove(start)
+    tour = [start]
+    idx = start
+    while tree.left:
+        nxt = tree.nearest(idx, cand)
+        tree.remove(nxt)
+        tour.append(nxt)
+        idx = nxt
+    tour.append(start)
+    return tour, tour_weight(coords, tour, dist)
+
+
+def tour_weight(coords, tour, dist=None):
+    """ Function to sum the edges of a closed tour
+    :param:
+        coords (list): List of [x, y] points
+    :param:
+        tour (list): Closed tour, first city repeated at the end
+    :param:
+        dist: Distance table or provider, computed from coords if None
+            (default is None)
+    :return:
+        int: weight of the tour
+    """
+    if dist is not None:
+        return sum(int(dist[tour[i]][tour[i+1]]) for i in range(len(tour) - 1))
+    sqrt = math.sqrt
+    w = 0
+    for i in range(len(tour) - 1):
+        (x1, y1), (x2, y2) = coords[tour[i]], coords[tour[i+1]]
+        w += round(sqrt((x1-x2)**2 + (y1-y2)**2))
+    return w
+
+
+def greedy_edge(coords, cand=None, dist=None):
+    """ Function to build a greedy edge tour.
+        Edges are taken shortest first if both ends have degree < 2 and they do not
+        close a cycle. Only candidate edges are streamed, from a heap holding one
+        pending candidate per city; fragments left over are chained by nearest endpoint.
+    :param:
+        coords (list): List of [x, y] points
+    :param:
+        cand (CandidateSet): Candidate neighbors, built from coords if None
+            (default is None)
+    :param:
+        dist: Distance table or provider for the weight, computed from coords if None
+            (default is None)
+    :return:
+        list, int: closed tour (first city repeated at the end), weight of the tour
+    """
+    n = len(coords)
+    if n < 3:
+        tour = list(range(n)) + [0] if n else []
+        return tour, tour_weight(coords, tour, dist)
+    if cand is None:
+        cand = CandidateSet(coords)
+    k = cand.k
+    ids, dists = cand.ids, cand.dists
+    sets = Set(n)
+    deg = bytearray(n)
+    adj = array('i', [-1]) * (2 * n)
+
+    # Heap of (d, i, j), each city has its next unused candidate in it
+    nxt = array('i', [0]) * n
+    heap = [(dists[i*k], i, ids[i*k]) for i in range(n) if k]
+    heapify(heap)
+    edges = 0
+    while heap and edges < n - 1:
+        d, i, j = heappop(heap)
+        if deg[i] < 2 and deg[j] < 2 and sets.union(i, j):
+            adj[2*i + deg[i]] = j
+            adj[2*j + deg[j]] = i
+            deg[i] += 1
+            deg[j] += 1
+            edges += 1
+        nxt[i] += 1
+        if deg[i] < 2 and nxt[i] < k:
+            p = i*k + nxt[i]
+            heappush(heap, (dists[p], i, ids[p]))
+
+    return chain_fragments(coords, adj, deg, dist)
+
+
+def chain_fragments(coords, adj, deg, dist=None):
+    """ Function to join path fragments into a tour, nearest free endpoint first
+    :param:
+        coords (list): List of [x, y] points
+    :param:
+        adj (array): adj[2*i], adj[2*i+1] are the neighbors of i, -1 if unused
+    :param:
+        deg (bytearray): Degree of every city, at most 2, no cycles
+    :param:
+        dist: Distance table or provider for the weight
+            (default is None)
+    :return:
+        list, int: closed tour (first city repeated at the end), weight of the tour
+    """
+    n = len(coords)
+    # Only fragment endpoints stay in the tree
+    grid = NearestTree(coords)
+    for c in range(n):
+        if deg[c] == 2:
+            grid.remove(c)
+
+    def walk(start, tour):
+        # Append the fragment from endpoint start, return its other end
+        prev, c = -1, start
+        while True:
+            tour.append(c)
+            a, b = adj[2*c], adj[2*c + 1]
+            nx = a if a != prev else b
+            if nx == -1 or nx == prev:
+                return c
+            prev, c = c, nx
+
+    first = next(c for c in range(n) if deg[c] < 2)
+    tour = []
+    grid.remove(first)
+    end = walk(first, tour)
+    if end != first:
+        grid.remove(end)
+    while grid.left:
+        x = grid.nearest(end)
+        grid.remove(x)
+        end = walk(x, tour)
+        if end != x:
+            grid.remove(end)
+    tour.append(tour[0])
+    return tour, tour_weight(coords, tour, dist)
+
+
+def prim_mst(coords, cand):
+    """ Function to build a minimum spanning tree with Prim over the candidate graph.
+        The candidate graph is made symmetric first; if it is not connected,
+        the tree grows into the next component through the nearest city outside it.
+    :param:
+        coords (list): List of [x, y] points
+    :param:
+        cand (CandidateSet): Candidate neighbors
+    :return:
+        list: (i, j, d) tree edges
+    """
+    n = len(coords)
+    k = cand.k
+    nbrs = [[] for _ in range(n)]
+    for i in range(n):
+        for p in range(i*k, (i+1)*k):
+            j, d = cand.ids[p], cand.dists[p]
+            nbrs[i].append((d, j))
+            nbrs[j].append((d, i))
+
+    outside = NearestTree(coords)
+    in_tree = bytearray(n)
+    edges = []
+    heap = [(0, 0, -1)]
+    last = 0
+    while outside.left:
+        if not heap:
+            # Candidate graph ran out, jump to the nearest city not in the tree
+            j = outside.nearest(last)
+            heap.append((round(math.dist(coords[last], coords[j])), j, last))
+        d, v, parent = heappop(heap)
+        if in_tree[v]:
+            continue
+        in_tree[v] = 1
+        outside.remove(v)
+        last = v
+        if parent != -1:
+            edges.append((parent, v, d))
+        for dv, u in nbrs[v]:
+            if not in_tree[u]:
+                heappush(heap, (dv, u, v))
+    return edges
+
+
+def odd_matching(coords, cand, odd):
+    """ Function to pair odd degree vertices cheaply.
+        Candidate pairs are matched shortest first, the rest by nearest free vertex.
+    :param:
+        coords (list): List of [x, y] points
+    :param:
+        cand (CandidateSet): Candidate neighbors
+    :param:
+        odd (list): Vertices of odd degree, an even number of them
+    :return:
+        list: (i, j, d) matching edges
+    """
+    n = len(coords)
+    free = bytearray(n)
+    for v in odd:
+        free[v] = 1
+    pairs = []
+    for v in odd:
+        for p in range(v*cand.k, (v+1)*cand.k):
+            u = cand.ids[p]
+            if free[u] and v < u:
+                pairs.append((cand.dists[p], v, u))
+    pairs.sort()
+    matching = []
+    for d, v, u in pairs:
+        if free[v] and free[u]:
+            free[v] = free[u] = 0
+            matching.append((v, u, d))
+
+    grid = NearestTree(coords)
+    for c in range(n):
+        if not free[c]:
+            grid.remove(c)
+    # One pass over odd, a vertex matched as u below is skipped when its turn comes
+    for v in odd:
+        if not free[v]:
+            continue
+        free[v] = 0
+        grid.remove(v)
+        u = grid.nearest(v)
+        free[u] = 0
+        grid.remove(u)
+        matching.append((v, u, round(math.dist(coords[v], coords[u]))))
+    return matching
+
+
+def euler_walk(n, edges, start=0):
+    """ Function to walk an Euler circuit of a connected multigraph with even degrees,
+        iterative Hierholzer
+    :param:
+        n (int): Number of vertices
+    :param:
+        edges (list): (i, j, d) edges, repeats allowed
+    :param:
+        start (int): First vertex
+            (default is 0)
+    :return:
+        list: vertices of the circuit, start at both ends
+    """
+    adj = [[] for _ in range(n)]
+    for e, (i, j, d) in enumerate(edges):
+        adj[i].append((j, e))
+        adj[j].append((i, e))
+    used = bytearray(len(edges))
+    ptr = [0] * n
+    stack = [start]
+    circuit = []
+    while stack:
+        v = stack[-1]
+        while ptr[v] < len(adj[v]) and used[adj[v][ptr[v]][1]]:
+            ptr[v] += 1
+        if ptr[v] == len(adj[v]):
+            circuit.append(stack.pop())
+        else:
+            u, e = adj[v][ptr[v]]
+            used[e] = 1
+            stack.append(u)
+    return circuit
+
+
+def shortcut(walk, n):
+    """ Function to turn a closed walk visiting every vertex into a tour, skipping repeats
+    :param:
+        walk (list): Closed walk
+    :param:
+        n (int): Number of vertices
+    :return:
+        list: closed tour, first vertex repeated at the end
+    """
+    seen = bytearray(n)
+    tour = []
+    for v in walk:
+        if not seen[v]:
+            seen[v] = 1
+            tour.append(v)
+    tour.append(tour[0])
+    return tour
+
+
+def mst_tour(coords, cand=None, dist=None, matching=True):
+    """ Function to build a tour from a minimum spanning tree.
+        Without matching this is the double tree tour, with it odd vertices of the
+        tree get a cheap matching first (Christofides style, not a minimum matching).
+    :param:
+        coords (list): List of [x, y] points
+    :param:
+        cand (CandidateSet): Candidate neighbors, built from coords if None
+            (default is None)
+    :param:
+        dist: Distance table or provider for the weight, computed from coords if None
+            (default is None)
+    :param:
+        matching (bool): Add a matching on odd degree vertices before the Euler walk
+            (default is True)
+    :return:
+        list, int: closed tour (first city repeated at the end), weight of the tour
+    """
+    n = len(coords)
+    if n < 3:
+        tour = list(range(n)) + [0] if n else []
+        return tour, tour_weight(coords, tour, dist)
+    if cand is None:
+        cand = CandidateSet(coords)
+    tree = prim_mst(coords, cand)
+    if matching:
+        deg = bytearray(n)
+        for i, j, d in tree:
+            deg[i] ^= 1
+            deg[j] ^= 1
+        odd = [v for v in range(n) if deg[v]]
+        edges = tree + odd_matching(coords, cand, odd)
+    else:
+        # Every tree edge twice, the walk is a depth first traversal
+        edges = tree + tree
+    tour = shortcut(euler_walk(n, edges), n)
+    return tour, tour_weight(coords, tour, dist)
+
+
+def hilbert_keys(coords, order=HILBERT_ORDER):
+    """ Function to compute the Hilbert curve index of every city
+    :param:
+        coords (list): List of [x, y] points
+    :param:
+        order (int): Curve order, coordinates are scaled to a 2**order grid
+            (default is HILBERT_ORDER)
+    :return:
+        list or ndarray: Hilbert index per city
+    """
+    n = len(coords)
+    side = 1 << order
+    if np is not None:
+        pts = np.asarray(coords, dtype=np.float64).reshape(n, 2)
+        lo = pts.min(axis=0)
+        span = max(float((pts.max(axis=0) - lo).max()), 1e-12)
+        g = ((pts - lo) * ((side - 1) / span)).astype(np.int64)
+        x, y = g[:, 0].copy(), g[:, 1].copy()
+        d = np.zeros(n, dtype=np.int64)
+        s = side >> 1
+        while s:
+            rx = (x & s) > 0
+            ry = (y & s) > 0
+            d += s * s * ((3 * rx) ^ ry)
+            # Rotate the quadrant so the curve stays continuous
+            flip = ~ry & rx
+            x = np.where(flip, side - 1 - x, x)
+            y = np.where(flip, side - 1 - y, y)
+            swap = ~ry
+            x, y = np.where(swap, y, x), np.where(swap, x, y)
+            s >>= 1
+        return d
+
+    xs = [x for x, y in coords]
+    ys = [y for x, y in coords]
+    x0, y0 = min(xs), min(ys)
+    span = max(max(xs) - x0, max(ys) - y0) or 1e-12
+    scale = (side - 1) / span
+    keys = []
+    for px, py in coords:
+        x, y = int((px - x0) * scale), int((py - y0) * scale)
+        d = 0
+        s = side >> 1
+        while s:
+            rx = 1 if x & s else 0
+            ry = 1 if y & s else 0
+            d += s * s * ((3 * rx) ^ ry)
+            if not ry:
+                if rx:
+                    x, y = side - 1 - x, side - 1 - y
+                x, y = y, x
+            s >>= 1
+        keys.append(d)
+    return keys
+
+
+def hilbert_tour(coords, cand=None, dist=None):
+    """ Function to build a space filling curve tour, cities in Hilbert curve order.
+        O(n log n) and vectorized with numpy, for when a tour is needed fast.
+    :param:
+        coords (list): List of [x, y] points
+    :param:
+        cand (CandidateSet): Unused, same signature as the other constructions
+            (default is None)
+    :param:
+        dist: Distance table or provider for the weight, computed from coords if None
+            (default is None)
+    :return:
+        list, int: closed tour (first city repeated at the end), weight of the tour
+    """
+    n = len(coords)
+    if n == 0:
+        return [], 0
+    keys = hilbert_keys(coords)
+    if np is not None:
+        tour = np.argsort(keys, kind="stable").tolist()
+    else:
+        tour = sorted(range(n), key=keys.__getitem__)
+    tour.append(tour[0])
+    return tour, tour_weight(coords, tour, dist)
@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+import math, mmap, os, tempfile
+from array import array
+from functools import lru_cache
+from time import perf_counter
+
+try:
+    import numpy as np
+except ImportError:     # numpy is optional, fall back to array module rows
+    np = None
+
+
+# Largest int32, used on the diagonal and for visited cells of compact tables
+INF = 2147483647
+
+# Rows computed per numpy block, keeps temporaries at ~BLOCK*n floats
+BLOCK = 1024
+
+# Above this many cities tspMain uses a memory-mapped table instead of one in RAM
+MATRIX_LIMIT = 20000
+
+# Above this many cities (14.4 GB of int32) tspMain uses LazyDistance instead of any table
+MAPPED_LIMIT = 60000
+
+# Cells computed per block of a memory-mapped table, ~32 MB float64 temporaries
+MAP_BLOCK_CELLS = 1 << 22
+
+
+def build_distance_table(coords, as_list=False):
+    """ Function to build the rounded euclidean distance table in one pass
+    :param:
+        coords (list): List of [x, y] points, index is the city id
+    :param:
+        as_list (bool): Return the old list of lists table
+            (default is False)
+    :return:
+        table: n x n table, int32 numpy array (or int32 array rows without numpy),
+            list of lists when as_list is set
+    """
+    n = len(coords)
+    if np is not None:
+        table = np.empty((n, n), dtype=np.int32)
+        xs, ys = split_coords(coords)
+        for lo in range(0, n, BLOCK):
+            hi = min(lo + BLOCK, n)
+            table[lo:hi] = block_rows(xs, ys, lo, hi)
+        return table.tolist() if as_list else table
+
+    sqrt = math.sqrt
+    rows = []
+    for xi, yi in coords:
+        row = [round(sqrt((xi-x)**2+(yi-y)**2)) for x, y in coords]
+        rows.append(row if as_list else array('i', row))
+    return rows
+
+
+def split_coords(coords):
+    """ Function to split coordinates into x and y float64 columns
+    :param:
+        coords (list): List of [x, y] points
+    :return:
+        ndarray, ndarray: x column, y column
+    """
+    pts = np.asarray(coords, dtype=np.float64).reshape(len(coords), 2)
+    return pts[:, 0].copy(), pts[:, 1].copy()
+
+
+def block_rows(xs, ys, lo, hi):
+    """ Function to compute rows lo..hi of the distance table
+    :param:
+        xs (ndarray): x column of all cities
+    :param:
+        ys (ndarray): y column of all cities
+    :param:
+        lo (int): First row
+    :param:
+        hi (int): One past the last row
+    :return:
+        ndarray: (hi-lo) x n int32 block
+    """
+    dx = xs[lo:hi, None] - xs[None, :]
+    dy = ys[lo:hi, None] - ys[None, :]
+    # Same sqrt/round-half-even as the scalar path, so both forms agree exactly
+    return np.rint(np.sqrt(dx*dx + dy*dy)).astype(np.int32)
+
+
+def as_lists(table):
+    """ Function to convert any distance table to the old list of lists form
+    :param:
+        table: Distance table or provider
+    :return:
+        list: List of lists copy of table
+    """
+    if np is not None and isinstance(table, np.ndarray):
+        return table.tolist()
+    return [list(row) for row in table]
+
+
+def save_distance_table(table, path):
+    """ Function to write a distance table as raw native int32 rows, see map_distance_table
+    :param:
+        table: n x n distance table, numpy array or rows
+    :param:
+        path (string): Output file
+    :return:
+        void
+    """
+    with open(path, 'wb') as w:
+        if np is not None and isinstance(table, np.ndarray):
+            np.ascontiguousarray(table, dtype=np.int32).tofile(w)
+        else:
+            for row in table:
+                w.write(array('i', row).tobytes())
+
+
+def map_distance_table(path, n):
+    """ Function to memory-map a table written by save_distance_table, read only.
+        Pages are loaded by the OS on first touch, so opening is O(1).
+    :param:
+        path (string): Table file
+    :param:
+        n (int): Number of cities
+    :return:
+        table: n x n int32 numpy memmap, MappedDistance without numpy
+    """
+    if np is not None:
+        if n == 0:
+            return np.empty((0, 0), dtype=np.int32)
+        # Plain ndarray view of the map, memmap rows are slower to index
+        return np.memmap(path, dtype=np.int32, mode='r', shape=(n, n)).view(np.ndarray)
+    return MappedDistance(path, n)
+
+
+def build_mapped_table(coords, path=None):
+    """ Function to compute the distance table block by block straight into a
+        memory-mapped file, so the OS page cache decides which rows stay in RAM.
+    :param:
+        coords (list): List of [x, y] points, index is the city id
+    :param:
+        path (string): Table file, kept for map_distance_table
+            (default is None, a temporary file in TMPDIR that is unlinked once mapped)
+    :return:
+        table, float: n x n table like map_distance_table, build seconds
+    """
+    n = len(coords)
+    t1_start = perf_counter()
+    temp = path is None
+    if temp:
+        fd, path = tempfile.mkstemp(suffix=".dist")
+        os.close(fd)
+    if np is not None and n > 0:
+        table = np.memmap(path, dtype=np.int32, mode='w+', shape=(n, n))
+        xs, ys = split_coords(coords)
+        rows = max(1, MAP_BLOCK_CELLS // n)
+        for lo in range(0, n, rows):
+            hi = min(lo + rows, n)
+            table[lo:hi] = block_rows(xs, ys, lo, hi)
+        table.flush()
+        table = table.view(np.ndarray)
+    else:
+        sqrt = math.sqrt
+        with open(path, 'wb') as w:
+            for xi, yi in coords:
+                w.write(array('i', [round(sqrt((xi-x)**2+(yi-y)**2)) for x, y in coords]).tobytes())
+        table = MappedDistance(path, n)
+    secs = perf_counter() - t1_start
+    if temp:
+        # The map keeps the pages, the name is not needed any more
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+    return table, secs
+
+
+def throughput(n, secs):
+    """ Function to describe the build speed of an n x n int32 table
+    :param:
+        n (int): Number of cities
+    :param:
+        secs (float): Build seconds
+    :return:
+        string: rows/s and MB/s
+    """
+    secs = max(secs, 1e-9)
+    return "%d rows in %.2f s, %.0f rows/s, %.1f MB/s" % (n, secs, n / secs, 4.0 * n * n / secs / 1e6)
+
+
+class MappedDistance:
+    """
+    Memory-mapped n x n int32 table used without numpy.
+    dist[i] is an int32 memoryview of row i, so dist[i][j] reads straight from the map.
+    """
+    def __init__(self, path, n):
+        self._k = n
+        self.cells = memoryview(b'').cast('i')
+        if n > 0:
+            with open(path, 'rb') as r:
+                self.map = mmap.mmap(r.fileno(), 0, access=mmap.ACCESS_READ)
+            self.cells = memoryview(self.map).cast('i')
+
+    def __len__(self):
+        return self._k
+
+    def __getitem__(self, i):
+        return self.cells[i*self._k:(i+1)*self._k]
+
+    def __iter__(self):
+        for i in range(self._k):
+            yield self[i]
+
+
+class LazyDistance:
+    """
+    Distance provider for instances too big for an n x n table.
+    d(i, j) is computed on demand from the coordinates, hot pairs are kept in a
+    bounded LRU cache. dist[i][j], len(dist) and row iteration work like a table.
+    """
+    CACHE_SIZE = 1 << 16
+
+    def __init__(self, coords, cache_size=CACHE_SIZE):
+        self.coords = coords
+        self.cache_size = cache_size
+        self._k = len(coords)
+        self._cols = None
+        self.pair = lru_cache(maxsize=cache_size)(self.calc)
+
+    def __reduce__(self):
+        # The cache is not picklable, rebuild an empty one on the other side
+        return LazyDistance, (self.coords, self.cache_size)
+
+    def __len__(self):
+        return self._k
+
+    def __getitem__(self, i):
+        return _LazyRow(self, i)
+
+    def __iter__(self):
+        for i in range(self._k):
+            yield _LazyRow(self, i)
+
+    def calc(self, i, j):
+        """ Function to compute a single distance, uncached
+        :param:
+            i (int): City id
+        :param:
+            j (int): City id
+        :return:
+            int: rounded euclidean distance
+        """
+        xi, yi = self.coords[i]
+        xj, yj = self.coords[j]
+        return round(math.sqrt((xi-xj)**2+(yi-yj)**2))
+
+    def get(self, i, j):
+        """ Function to get a distance through the LRU cache
+        :param:
+            i (int): City id
+        :param:
+            j (int): City id
+        :return:
+            int: rounded euclidean distance
+        """
+        # Symmetric, so store each pair once
+        return self.pair(i, j) if i < j else self.pair(j, i)
+
+    def row(self, i):
+        """ Function to compute a full row, bypasses the cache so scans don't evict hot pairs
+        :param:
+            i (int): City id
+        :return:
+            list: distances from i to every city
+        """
+        if np is not None:
+            if self._cols is None:
+                self._cols = split_coords(self.coords)
+            xs, ys = self._cols
+            return block_rows(xs, ys, i, i+1)[0].tolist()
+        xi, yi = self.coords[i]
+        sqrt = math.sqrt
+        return [round(sqrt((xi-x)**2+(yi-y)**2)) for x, y in self.coords]
+
+    def cache_info(self):
+        return self.pair.cache_info()
+
+
+class _LazyRow:
+    """
+    Row view returned by LazyDistance[i], read only
+    """
+    __slots__ = ('table', 'i')
+
+    def __init__(self, table, i):
+        self.table = table
+        self.i = i
+
+    def __getitem__(self, j):
+        return self.table.get(self.i, j)
+
+    def __len__(self):
+        return self.table._k
+
+    def __iter__(self):
+        return iter(self.table.row(self.i))
@@ -5,31 +5,36 @@ import itertools # Used to find all possible sets
 # Disjoint set
 # Union - Find
 class Set:
-    # set: disjoint set of vertices
-    # ln: length of set
+    # set: parent of each vertex, -(rank+1) for a root
+    # ln: number of unions made
     def __init__(self, n):
         self.set = [-1]*n
         self.ln = 0
 
-    # Create a union of two sets
+    # Create a union of two sets, by rank
+    # Returns False if v1 and v2 were already in the same set
     def union(self, v1, v2):
-        if self.set[v1] < self.set[v2]:
-            self.set[v1] = v2
-        else:
-            if self.set[v1] == self.set[v1]:
-                self.set[v1] -= 1
-            self.set[v2] = v1
+        r1 = self.find(v1)
+        r2 = self.find(v2)
+        if r1 == r2:
+            return False
+        # Roots hold -(rank+1), so the smaller value has the higher rank
+        if self.set[r1] > self.set[r2]:
+            r1, r2 = r2, r1
+        if self.set[r1] == self.set[r2]:
+            self.set[r1] -= 1
+        self.set[r2] = r1
         self.ln += 1
+        return True
 
-    # Find value in set
-    def find(self, r):
-        x = r[0] + r[1]
-        if self.set[x] < 0:
-            return x
-        n = 0
-        while self.set[n] > 0:
-            n = self.set[n]
-        return n
+    # Find root of the set holding x, with path compression
+    def find(self, x):
+        root = x
+        while self.set[root] >= 0:
+            root = self.set[root]
+        while self.set[x] >= 0 and self.set[x] != root:
+            self.set[x], x = root, self.set[x]
+        return root
 
 
 # Definition of graph
@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+from tspSolver import Distance, prepare
+from distanceTable import MATRIX_LIMIT, MAPPED_LIMIT, save_distance_table, map_distance_table
+from candidateSet import CandidateSet, CANDIDATES
+from tspIO import iter_instances
+from array import array
+from itertools import islice
+import os, sys, json, shutil, hashlib
+
+# Default size cap of a cache directory, least recently used files go first
+CACHE_LIMIT = 1 << 30
+
+# Bumped when the layout of an entry changes, older entries are then never hit
+CACHE_VERSION = 1
+
+
+class InstanceCache:
+    """
+    On-disk cache of parsed instances and their distance table and candidate lists.
+    Entries are keyed by a hash of the file content, so an edited file is simply
+    a new key and its old entry is dropped. Layout:
+        <cache_dir>/<hash>/meta.json          source file, instance count once known
+        <cache_dir>/<hash>/<i>/coords.bin     int64 id, x, y per city (coords_real.bin: float64)
+        <cache_dir>/<hash>/<i>/dist.bin       int32 n x n table, memory-mapped on load
+        <cache_dir>/<hash>/<i>/cand_<k>.bin   int32 neighbor ids then distances
+    Arrays are raw native-endian, the byte order is part of the key.
+    """
+    def __init__(self, cache_dir=None, limit=CACHE_LIMIT):
+        self.cache_dir = cache_dir
+        self.limit = limit
+
+    def file_key(self, in_file):
+        """ Function to hash the content of a file
+        :param:
+            in_file (string): Instance file
+        :return:
+            string: hex digest
+        """
+        h = hashlib.sha256(b"%d %s" % (CACHE_VERSION, sys.byteorder.encode()))
+        with open(in_file, 'rb') as r:
+            for chunk in iter(lambda: r.read(1 << 20), b''):
+                h.update(chunk)
+        return h.hexdigest()
+
+    def root(self, in_file):
+        # Default cache dir is next to the input
+        if self.cache_dir is not None:
+            return self.cache_dir
+        return os.path.join(os.path.dirname(os.path.abspath(in_file)), ".tspcache")
+
+    def iter_instances(self, in_file, k=CANDIDATES, cls=Distance):
+        """ This function yields the instances of a file with dist and cand ready.
+            Cached instances are loaded without reading the file, missing ones
+            are parsed, built and stored.
+        :param:
+            in_file (string): Instance file
+        :param:
+            k (int): Candidate neighbors per city
+                (default is CANDIDATES)
+        :param:
+            cls (class): Graph subclass to build
+                (default is Distance)
+        :return:
+            generator: graph objects, in file order
+        """
+        root = self.root(in_file)
+        entry = os.path.join(root, self.file_key(in_file))
+        meta = self.read_meta(entry)
+        if meta is None:
+            self.drop_source(root, in_file)
+            os.makedirs(entry, exist_ok=True)
+            meta = {"source": os.path.abspath(in_file), "count": None}
+            self.write_meta(entry, meta)
+        self.touch(entry)
+
+        parser = None
+        i = 0
+        while meta["count"] is None or i < meta["count"]:
+            g = self.load(os.path.join(entry, str(i)), k, cls)
+            if g is None:
+                if parser is None:
+                    parser = islice(iter_instances(in_file, cls), i, None)
+                g = next(parser, None)
+                if g is None:
+                    meta["count"] = i
+                    self.write_meta(entry, meta)
+                    break
+                self.store(os.path.join(entry, str(i)), g, k)
+                self.evict(root, entry)
+            elif parser is not None:
+                # Keep the parser in step with the cached instance
+                next(parser, None)
+            yield g
+            i += 1
+
+    def load(self, folder, k, cls):
+        """ Function to load one cached instance
+        :param:
+            folder (string): Instance folder of an entry
+        :param:
+            k (int): Candidate neighbors per city, built and added when missing
+        :param:
+            cls (class): Graph subclass to build
+        :return:
+            obj: graph with g, ids, dist and cand set, None on a miss
+        """
+        for name, code in (("coords.bin", 'q'), ("coords_real.bin", 'd')):
+            coords_bin = os.path.join(folder, name)
+            if os.path.isfile(coords_bin):
+                break
+        else:
+            return None
+        v = array(code)
+        with open(coords_bin, 'rb') as r:
+            v.frombytes(r.read())
+        n = len(v) // 3
+        g = cls(n)
+        g.g = [list(p) for p in zip(v[1::3], v[2::3])]
+        g.ids = dict(zip(map(int, v[0::3]), map(tuple, g.g)))
+
+        dist_bin = os.path.join(folder, "dist.bin")
+        if n > MAPPED_LIMIT:
+            g.init_lazy_distance()
+        elif os.path.isfile(dist_bin) and os.path.getsize(dist_bin) == 4 * n * n:
+            g.dist = map_distance_table(dist_bin, n)
+            g.dist_path = dist_bin
+        elif n > MATRIX_LIMIT:
+            g.init_mapped_distance(dist_bin)
+        else:
+            g.init_distance_table()
+            save_distance_table(g.dist, dist_bin)
+
+        cand_bin = os.path.join(folder, "cand_%d.bin" % k)
+        kk = max(0, min(k, n - 1))
+        if os.path.isfile(cand_bin) and os.path.getsize(cand_bin) == 8 * n * kk:
+            c = array('i')
+            with open(cand_bin, 'rb') as r:
+                c.frombytes(r.read())
+            g.cand = CandidateSet.from_arrays(n, kk, c[:n*kk], c[n*kk:])
+        else:
+            g.init_candidates(k)
+            save_candidates(g.cand, cand_bin)
+        return g
+
+    def store(self, folder, g, k=CANDIDATES):
+        """ Function to build and write one parsed instance. The folder is written under a
+            temporary name and renamed, so readers never see half an entry.
+        :param:
+            folder (string): Instance folder of an entry
+        :param:
+            g (obj): Parsed graph, dist and cand are set here
+        :param:
+            k (int): Candidate neighbors asked for, names the candidate file
+        :return:
+            void
+        """
+        tmp = "%s.tmp%d" % (folder, os.getpid())
+        os.makedirs(tmp, exist_ok=True)
+        # A memory-mapped table is built in place
+        dist_bin = os.path.join(tmp, "dist.bin")
+        prepare(g, k, dist_bin)
+        # ids are in file order, the same order as g.g
+        real = any(isinstance(x, float) or isinstance(y, float) for x, y in g.g)
+        v = array('d' if real else 'q')
+        for c, (x, y) in zip(g.ids, g.g):
+            v.extend((c, x, y))
+        with open(os.path.join(tmp, "coords_real.bin" if real else "coords.bin"), 'wb') as w:
+            w.write(v.tobytes())
+        if len(g.g) <= MATRIX_LIMIT:
+            save_distance_table(g.dist, dist_bin)
+        save_candidates(g.cand, os.path.join(tmp, "cand_%d.bin" % k))
+        renamed = True
+        try:
+            os.rename(tmp, folder)
+        except OSError:
+            # Another process stored it first
+            renamed = False
+            shutil.rmtree(tmp, ignore_errors=True)
+        if g.dist_path is not None:
+            # A mapped table was built under tmp, its file now lives in the entry
+            dist_bin = os.path.join(folder, "dist.bin")
+            n = g.get_length()
+            if os.path.isfile(dist_bin) and os.path.getsize(dist_bin) == 4 * n * n:
+                if not renamed:
+                    # Our file is gone with tmp, map the table of the entry that won
+                    g.dist = map_distance_table(dist_bin, n)
+                g.dist_path = dist_bin
+            else:
+                g.dist_path = None
+
+    def read_meta(self, entry):
+        try:
+            with open(os.path.join(entry, "meta.json"), 'r') as r:
+                return json.load(r)
+        except (OSError, ValueError):
+            return None
+
+    def write_meta(self, entry, meta):
+        tmp = os.path.join(entry, "meta.json.tmp%d" % os.getpid())
+        with open(tmp, 'w') as w:
+            json.dump(meta, w)
+        os.replace(tmp, os.path.join(entry, "meta.json"))
+
+    def touch(self, entry):
+        # The entry mtime is its last use, evict goes by it
+        os.utime(entry)
+
+    def entries(self, root):
+        """ Function to list the entries of a cache dir
+        :param:
+            root (string): Cache dir
+        :return:
+            list: (last use, bytes, path) per entry
+        """
+        out = []
+        for name in os.listdir(root):
+            path = os.path.join(root, name)
+            if not os.path.isdir(path):
+                continue
+            size = 0
+            for sub_dir, dirs, files in os.walk(path):
+                for f in files:
+                    size += os.path.getsize(os.path.join(sub_dir, f))
+            out.append((os.path.getmtime(path), size, path))
+        return out
+
+    def drop_source(self, root, in_file):
+        """ Function to remove entries left by older contents of in_file
+        :param:
+            root (string): Cache dir
+        :param:
+            in_file (string): Instance file
+        :return:
+            void
+        """
+        if not os.path.isdir(root):
+            return
+        src = os.path.abspath(in_file)
+        for used, size, path in self.entries(root):
+            meta = self.read_meta(path)
+            if meta is not None and meta.get("source") == src:
+                shutil.rmtree(path, ignore_errors=True)
+
+    def evict(self, root, keep):
+        """ Function to remove least recently used entries until the cache fits the size cap
+        :param:
+            root (string): Cache dir
+        :param:
+            keep (string): Entry in use, never removed
+        :return:
+            void
+        """
+        entries = sorted(self.entries(root))
+        total = sum(e[1] for e in entries)
+        for used, size, path in entries:
+            if total <= self.limit:
+                break
+            if path != keep:
+                shutil.rmtree(path, ignore_errors=True)
+                total -= size
+
+
+def save_candidates(cand, path):
+    """ Function to write candidate lists, ids then distances, both int32
+    :param:
+        cand (CandidateSet): Candidate lists
+    :param:
+        path (string): Output file
+    :return:
+        void
+    """
+    with open(path, 'wb') as w:
+        w.write(array('i', cand.ids).tobytes())
+        w.write(array('i', cand.dists).tobytes())
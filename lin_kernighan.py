@@ -1,6 +1,23 @@
 #!/usr/bin/env python3
-import math, random, sys
+import random, sys, os, tempfile
+import multiprocessing, signal
 from euclideanGraph import Graph
+from distanceTable import build_distance_table, build_mapped_table, map_distance_table, as_lists, LazyDistance
+from tspSolver import prepare
+from candidateSet import CandidateSet, CANDIDATES
+from tour import Tour, make_tour
+import localSearch
+import profiler
+from budget import Budget, expired
+from construction import mst_tour
+
+
+# Deepest k of a k-opt move tried by lk
+MAX_DEPTH = 50
+# Alternatives tried for y at each level before going greedy
+BREADTH = (5, 3, 1)
+# Seconds parallel_lk waits for a result before checking its budget again
+POLL = 0.1
 
 
 # Class for Lin Kernighan
@@ -8,15 +25,22 @@ class LKTsp(Graph):
     def __init__(self, _k=0):
         Graph.__init__(self, _k)
         self.dist = [[]]
-        self.tour = []
+        self.tour = Tour([])
         self.len_ = 0
         self.path = []
+        self.cand = None
+        # File of a memory-mapped dist, None when it has no name
+        self.dist_path = None
+        self.max_depth = MAX_DEPTH
+        self.breadth = BREADTH
 
     # Creates a random tour
     def init_tour(self):
         tmp = [i for i in range(0, self._k)]
         random.shuffle(tmp)
-        self.tour = tmp
+        # The tour keeps its length only once there is a table, not the [[]] placeholder
+        dist = self.dist if len(self.dist) == self._k else None
+        self.tour = make_tour(tmp, dist=dist)
         self.len_ = len(tmp)
 
     def get_length(self):
@@ -24,22 +48,35 @@ class LKTsp(Graph):
 
     # Get previous town id
     def get_prev_id(self, i):
-        return self.len_-1 if i == 0 else i-1
+        return self.tour.position(self.tour.prev(self.tour[i]))
 
     # Get next town id
     def get_next_id(self, i):
-        return (i+1) % self.len_
+        return self.tour.position(self.tour.next(self.tour[i]))
 
     # Create a table with all the distances
-    def init_distance_table(self):
-        print(self._k)
-        self.dist = [[0]*self._k for i in range(self._k)]
-        for i in range(0, self._k):
-            for j in range(0, self._k):
-                # Calculate inner product of all combinations of sets
-                self.dist[i][j] = int(round(math.sqrt((self.g[i][0]-self.g[j][0])**2+(self.g[i][1]-self.g[j][1])**2)))
+    # as_list keeps the old list of lists table instead of the int32 table
+    def init_distance_table(self, as_list=False):
+        self.dist = build_distance_table(self.g, as_list)
+
+    # Build the k nearest neighbor candidate lists
+    def init_candidates(self, k=CANDIDATES):
+        self.cand = CandidateSet(self.g, k)
+
+    # Compute distances on demand, keeping cache_size hot pairs
+    def init_lazy_distance(self, cache_size=LazyDistance.CACHE_SIZE):
+        self.dist = LazyDistance(self.g, cache_size)
+
+    # Table computed into a memory-mapped file, returns the build seconds
+    def init_mapped_distance(self, path=None):
+        self.dist, secs = build_mapped_table(self.g, path)
+        self.dist_path = path
+        return secs
 
     def get_tour_dist(self):
+        # Tours made by init_tour keep their length as moves are applied, O(1)
+        if self.tour.length is not None:
+            return self.tour.length
         distance = 0
         for k in range(0, self.len_):
             i = self.tour[k]
@@ -60,61 +97,8 @@ class LKTsp(Graph):
         :return:
             int: index of town in tour
         """
-        i = 0
-        for town in self.tour:
-            if id_ is town:
-                return i
-            else:
-                i += 1
-        return -1
-
-    def get_neighbor(self, curr):
-        """ This function returns the nearest neighbor to a given town
-        :arg:
-            curr (int): Current town index
-
-        :return:
-             int: Nearest town index
-        """
-        curr_vertex = self.tour[curr]
-        nearest_town = -1
-        min_dist = 2147483647
-        for i in range(self._k):
-            if i != curr_vertex:
-                dist = self.get_dist(i, curr_vertex)
-                if dist < min_dist:
-                    nearest_town = self.get_index(i)
-                    min_dist = dist
-        return nearest_town
-
-    def check_valid_tour(self, tour2):
-        if len(tour2) != self.len_:
-            return False
-        else:
-            for i in range(0, self.len_-1):
-                for j in range(0, self.len_):
-                    if tour2[i] == tour2[j]:
-                        return False
-        return True
-
-    def select_tour(self, tour_idx):
-        """ This function selects a new tour
-        :arg:
-            tour_idx ([int]): tour index array
-
-        :return:
-            int: tour that is selected
-        """
-        n1 = self.get_prev_id(tour_idx[len(tour_idx)-1])
-        n2 = self.get_next_id(tour_idx[len(tour_idx)-1])
-        tour = self.create_tour(self.tour, tour_idx, n1)
-
-        if self.check_valid_tour(tour):
-            return n1
-        else:
-            tour2 = self.create_tour(self.tour, tour_idx, n2)
-            if self.check_valid_tour(tour2):
-                return n2
+        if 0 <= id_ < self.len_:
+            return self.tour.position(id_)
         return -1
 
     def improve(self, curr, prev=False):
@@ -126,295 +110,366 @@ class LKTsp(Graph):
             curr (int): Current town index
 
         :return:
-            void
+            int: gain of the move applied, 0 if none was found
         """
         id2 = self.get_prev_id(curr) if prev else self.get_next_id(curr)
-        id3 = self.get_neighbor(id2)
-
-        if id3 != -1 and self.get_dist(id2, id3) < self.get_dist(curr, id2):
-            self.lk(curr, id2, id3)
-        elif not prev:
+        gain = self.lk(curr, id2)
+        if gain == 0 and not prev:
             # Condition for previous id
-            self.improve(curr, True)
+            gain = self.improve(curr, True)
+        return gain
 
-    def run_lk(self):
+    def run_lk(self, max_depth=None, breadth=None, or_opt=False, budget=None):
+        """ This function runs lk from every town until a pass gives no improvement,
+            or until budget expires. Every lk move leaves a valid tour, so the
+            tour is the best found so far whenever it stops.
+        :arg:
+            max_depth (int): Deepest k-opt move to try
+                (default is self.max_depth)
+        :arg:
+            breadth (tuple): Alternatives tried per level, 1 past the end
+                (default is self.breadth)
+        :arg:
+            or_opt (bool): Run an or-opt pass after every lk pass
+                (default is False)
+        :arg:
+            budget (Budget): Stop once expired
+                (default is None)
+        :return:
+            void
+        """
+        if max_depth is not None:
+            self.max_depth = max_depth
+        if breadth is not None:
+            self.breadth = breadth
+        if self.cand is None:
+            self.init_candidates()
         old_gain = 0
         new_gain = self.get_tour_dist()
 
         while True:
             old_gain = new_gain
-            for i in range(0, self.len_):
-                self.improve(i)
+            # Walk towns, not indexes, moves shift indexes around
+            for town in self.tour.to_list():
+                if expired(budget):
+                    return
+                self.improve(self.get_index(town))
+            if or_opt:
+                localSearch.or_opt(self.tour, self.dist, self.cand, budget=budget)
             new_gain = self.get_tour_dist()
             # Base case if no more improvements can be made
             if new_gain >= old_gain:
                 break
 
-    def lk(self, id1, id2, id3):
-        """ This function is the driver of the lin-kernighan algorithm
+    def lk(self, id1, id2, id3=-1):
+        """ This function is the driver of the lin-kernighan algorithm.
+            Breaks edge (t1, t2) and searches a sequential k-opt move from it,
+            applied to the tour in place, kept only if the tour gets shorter.
         :arg:
             id1 (int): id of first town
         :arg:
-            id2 (int): id of second town
+            id2 (int): id of second town, next to the first town
         :arg:
-            id3 (int): id of third town
+            id3 (int): id of third town, only this y1 is tried
+                (default is -1, try the candidates of the second town)
         :return:
-            void
+            int: gain of the move, 0 if the tour is unchanged
         """
-        tour_idx = [-1, id1, id2, id3]
-        gain = self.get_dist(id2, id3) - self.get_dist(id3, id2)
-        i = 3
-        gt = 0
-        for j in range(4, self.len_**10, 2):
-            new_id = self.select_tour(tour_idx)
-            # This case should not evaluate according to LK paper
-            if new_id == -1:
-                break
-            ii = self.next_y(tour_idx)
-            if ii == -1:
+        if self.cand is None:
+            self.init_candidates()
+        t1 = self.tour[id1]
+        t2 = self.tour[id2]
+        t3 = self.tour[id3] if id3 != -1 else -1
+        n = self.len_
+        # Broken (x) and added (y) edges of the current move, as int keys
+        broken = {edge_key(t1, t2, n)}
+        added = set()
+        return self.lk_step(1, t1, t2, self.dist[t1][t2], broken, added, t3)
+
+    def lk_step(self, level, t1, t2, g, broken, added, only=-1):
+        """ This function tries every allowed y from t2 and recurses, depth first
+        :arg:
+            level (int): depth of the move, 1 for the first y
+        :arg:
+            t1 (int): town the move started from
+        :arg:
+            t2 (int): free end, next to t1 in the current tour
+        :arg:
+            g (int): gain of the open path, sum of x minus sum of y so far
+        :arg:
+            broken (set): keys of edges removed so far
+        :arg:
+            added (set): keys of edges added so far
+        :arg:
+            only (int): only try this t3
+                (default is -1)
+        :return:
+            int: gain of the move applied, 0 if the tour was put back
+        """
+        n = self.len_
+        dist = self.dist
+        tour = self.tour
+        fwd = tour.next(t1) == t2
+        after_t2 = tour.next(t2) if fwd else tour.prev(t2)
+
+        alts = []
+        for t3, d23 in zip(self.cand.neighbors(t2), self.cand.neighbor_dists(t2)):
+            # Positive gain criterion, candidates are sorted so stop early
+            if g - d23 <= 0:
                 break
-
-            gain += self.get_dist(tour_idx[len(tour_idx)-2], new_id)
-            dff = gain - self.get_dist(new_id, id1)
-            print("dff: ", dff)
-            if dff > gt:
-                i = j
-                gt = dff
-            gt -= self.get_dist(new_id, ii)
-            tour_idx.append(ii)
-
-        if gt > 0:
-            tour_idx[i+1] = tour_idx[1]
-            self.tour = get_tour_prime(tour_idx, i)
-
-    def next_x(self, tour_idx, i):
-        return self.check_connection(tour_idx, i, self.get_next_id(i)) or\
-               self.check_connection(tour_idx, i, self.get_prev_id(i))
-
-    def check_connection(self, tour_idx, x, y):
-        if x == y:
-            return False
-        else:
-            for i in range(1, len(tour_idx)-1, 2):
-                x, y = self.ids[tour_idx[i]]
-                if x == x and y == y:
-                    return False
-                if x == y and y == x:
-                    return False
-        return True
-
-    def check_positive_gain(self, tour_idx, j):
-        gain = 0
-        for i in range(0, len(tour_idx) - 2):
-            id1 = tour_idx[i]
-            id2 = tour_idx[i + 1]
-            id3 = j if i == len(tour_idx) - 3 else tour_idx[i + 2]
-            gain += self.get_dist(id2, id3) - self.get_dist(id1, id2)
-        return gain > 0
-
-    def next_y(self, tour_idx):
-        j = tour_idx[len(tour_idx)-1]
-        new_y = []
-        for i in range(0, len(tour_idx)):
-            if not self.check_positive_gain(tour_idx, j):
+            if t3 == after_t2 or (only != -1 and t3 != only):
                 continue
-            if not self.check_disjoint(tour_idx, i, j):
+            if edge_key(t2, t3, n) in broken:
                 continue
-            if not self.next_x(tour_idx, i):
+            t4 = tour.prev(t3) if fwd else tour.next(t3)
+            if edge_key(t3, t4, n) in added:
                 continue
-            new_y.append(i)
-
-        min_dist = 2147483647
-        min_id = -1
-        for i in range(0, len(new_y)):
-            d = self.get_dist(j, i)
-            if d < min_dist:
-                min_dist = d
-                min_id = i
-        return min_id
-
-    def get_edges_from_tour(self, tour):
-        """ This function just returns a list of vertices from tour
-        :arg:
-            tour (int): tour
-        :return:
-            Edge: returns list of edge objects
-        """
-        res = []
-        for i in range(0, len(tour)):
-            if tour[i] == -1:
-                x, y = -1, -1
-            else:
-                x, y = self.ids[tour[i]]
-            e = Edge(x, x)
-            res.append(e)
-        return res
-
-    def create_tour(self, tour, tour_idx, val=-1):
-        """ This function adds a value to tour
+            alts.append((dist[t3][t4] - d23, t3, t4, d23))
+        alts.sort(reverse=True)
+
+        width = self.breadth[level-1] if level <= len(self.breadth) else 1
+        for _, t3, t4, d23 in alts[:width]:
+            self.lk_flip(t1, t2, t3)
+            y, x = edge_key(t2, t3, n), edge_key(t3, t4, n)
+            added.add(y)
+            broken.add(x)
+            g2 = int(g - d23 + dist[t3][t4])
+            # Closing with (t4, t1) is the tour as it stands now
+            if g2 - dist[t4][t1] > 0:
+                return int(g2 - dist[t4][t1])
+            if level < self.max_depth:
+                gain = self.lk_step(level + 1, t1, t4, g2, broken, added)
+                if gain > 0:
+                    return gain
+            # Dead end, put the tour back
+            self.lk_flip(t1, t4, t3)
+            added.discard(y)
+            broken.discard(x)
+        return 0
+
+    def lk_flip(self, t1, t2, t3):
+        """ This function swaps (t1, t2), (t4, t3) for (t2, t3), (t1, t4) in place.
+            t4 is the town before t3 walking from t1 through t2, so t4 ends next to t1.
+            lk_flip(t1, t4, t3) undoes it.
         :arg:
-            tour_idx ([int]): tour index array
+            t1 (int): fixed town
         :arg:
-            val (int): value to be added to tour
-                (Default -1)
-        :return:
-            adds val to tour
-        """
-        t = tour_idx
-        if val != -1:
-            t.append(val)
-            t.append(t[1])
-        curr_edge = self.get_edges_from_tour(tour)
-        x = self.get_x_edges(t)
-        y = self.get_y_edges(t)
-        ln = len(curr_edge)
-
-        for edge in x:
-            for j in range(0, len(curr_edge)):
-                e = curr_edge[j]
-                if e == edge:
-                    curr_edge.remove(curr_edge[j])
-                    ln -= 1
-                    break
-        for edge in y:
-            print(edge.v1, edge.v2)
-            curr_edge.append(edge)
-            ln += 1
-
-        return self.tour_from_edges(curr_edge, ln)
-
-    def create_eulerian_tour(self, tour, tour_idx):
-        queue = [[[], tour[0], tour]]
-
-        while queue:
-            path, node, unvisited = queue.pop()
-            path += [node]
-
-            if not unvisited:
-                return path
-            for edge in unvisited:
-                if node in edge:
-                    queue += [[path, next_node(node, edge)]]
-
-    def hierholzer(self, tour_idx):
-        start = tour_idx[0]
-        tour = [start]
-        traversed = {}
-        idx = 0
-
-        while len(traversed) // 2 < len(self.sets) and idx < len(tour):
-            subset = []
-
-    def dfs(self, u, root, subset, traversed):
-        for v in self.dist[u]:
-            if (u, v) not in traversed or (v, u) not in traversed:
-                traversed[(u, v)] = traversed[(v, u)] = True
-                subset.append(v)
-                if v == root:
-                    return
-                else:
-                    self.dfs(u, root, subset, traversed)
-
-    def get_y_edges(self, tour):
-        """ This function just returns a list of vertices from tour
+            t2 (int): town next to t1
         :arg:
-            tour (int): tour
+            t3 (int): town that gets the new edge to t2
         :return:
-            Edge: returns list of edge objects to be added
+            int: t4
         """
-        res = []
-        for i in range(2, self.len_-1):
-            if tour[i] == -1:
-                x, y = -1, -1
-            else:
-                x, y = self.ids[tour[i]]
-            e = Edge(x, y)
-            res.append(e)
-        return res
+        if self.tour.next(t1) == t2:
+            t4 = self.tour.prev(t3)
+            self.tour.flip(t2, t4)
+        else:
+            t4 = self.tour.next(t3)
+            self.tour.flip(t4, t2)
+        return t4
 
-    def get_x_edges(self, tour):
-        """ This function just returns a list of vertices from tour
+    def create_eulerian_tour(self, matching=True):
+        """ This function sets the tour to a shortcut euler walk over a minimum spanning tree
         :arg:
-            tour (int): tour
-        :return:
-            Edge: returns list of edge objects to be added
-        """
-        res = []
-        for i in range(1, self.len_-2):
-            if tour[i] == -1:
-                x, y = -1, -1
-            else:
-                x, y = self.ids[tour[i]]
-            e = Edge(x, y)
-            res.append(e)
-        return res
-
-    def check_disjoint(self, tour_idx, i, j):
-        """ This funciton checks if an edge is ready in the set
-        :param:
-            tour_idx ([int]): list of tour index
-        :param:
-            i (int): index of an endpoint
-        :param:
-            j (int): index of an endpoint
+            matching (bool): Pair odd degree vertices first, else walk the doubled tree
+                (default is True)
         :return:
-
+            int: length of the new tour
         """
-        if i == j:
-            return False
-        for k in range(0, len(tour_idx)):
-            x, y = self.ids[k]
-            if x == i and y == j:
-                return False
-            if x == j and y == i:
-                return False
-        return True
-
-    def tour_from_edges(self, curr_edge, ln):
-        tour = [-1 for i in range(ln)]
-        end = -1
-        i = 0
-        for i in range(0, len(curr_edge)):
-            if curr_edge[i] is not None:
-                tour[0] = curr_edge[i].v1
-                tour[1] = curr_edge[i].v2
-                end = tour[1]
+        if self.cand is None:
+            self.init_candidates()
+        tour, weight = mst_tour(self.g, self.cand, self.dist, matching)
+        self.tour = make_tour(tour[:-1], dist=self.dist)
+        self.len_ = len(self.tour)
+        return weight
+
+
+# (LKTsp, or_opt, Budget, pool) of the current worker, built once by lk_worker_init
+worker_lk = None
+
+
+def lk_worker_init(coords, max_depth, breadth, or_opt, budget=None, pool=False, dist=None, cand=None):
+    """ This function sets up the instance of a worker, once per worker
+    :arg:
+        coords (list): List of [x, y] points
+    :arg:
+        max_depth (int): Deepest k-opt move to try
+    :arg:
+        breadth (tuple): Alternatives tried per level
+    :arg:
+        or_opt (bool): Interleave or-opt passes
+    :arg:
+        budget (Budget): Restarts return their tour so far once it expires
+            (default is None)
+    :arg:
+        pool (bool): Running in a pool worker
+            (default is False)
+    :arg:
+        dist: Distances built by the parent, or the file name of its memory-mapped table
+            (default is None, built here)
+    :arg:
+        cand (CandidateSet): Candidate lists built by the parent
+            (default is None, built here)
+    :return:
+        void
+    """
+    global worker_lk
+    if budget is None:
+        budget = Budget()
+    if pool:
+        # Ctrl-C reaches the whole process group, each restart then returns its tour so far
+        signal.signal(signal.SIGINT, budget.interrupt)
+        # A forked worker inherits the parent's profiler, it counts on its own and
+        # lk_restart hands the counts back with each result
+        profiler.worker_start()
+    g = LKTsp(len(coords))
+    g.g = coords
+    # The parent's proxies count into the parent's Counter, instrument wraps them again
+    if isinstance(dist, profiler.CountingDistance):
+        dist = dist.table
+    if isinstance(cand, profiler.CountingCandidates):
+        cand = cand.cand
+    if dist is None:
+        prepare(g)
+    else:
+        # A file name is the parent's mapped table, opened read only, so
+        # no worker builds or copies a table of its own
+        g.dist = map_distance_table(dist, len(coords)) if isinstance(dist, str) else dist
+        g.dist_path = dist if isinstance(dist, str) else None
+        g.cand = cand
+        if g.cand is None:
+            g.init_candidates()
+    g.max_depth = max_depth
+    g.breadth = breadth
+    profiler.instrument(g)
+    worker_lk = g, or_opt, budget, pool
+
+
+def lk_restart(seed):
+    """ This function runs one restart, random tour from seed then lk
+    :arg:
+        seed (int): Seed of the start tour, same seed gives the same result
+    :return:
+        int, list, int, Counter: tour length, tour, seed, profiler counts of a pool worker
+    """
+    g, or_opt, budget, pool = worker_lk
+    random.seed(seed)
+    g.init_tour()
+    g.run_lk(or_opt=or_opt, budget=budget)
+    counts = profiler.take_counts() if pool else None
+    return g.get_tour_dist(), g.tour.to_list(), seed, counts
+
+
+def parallel_lk(coords, restarts=8, workers=None, seed=0, target=None, time_limit=None,
+                max_depth=MAX_DEPTH, breadth=BREADTH, or_opt=False, budget=None, graph=None):
+    """ This function runs init_tour + run_lk restarts on a process pool and keeps the best.
+        Restart i uses seed + i, so results do not depend on the number of workers.
+        Outstanding restarts are cancelled once target is reached or the budget expires,
+        running restarts then return the tour they have so far.
+        Distances are built once, here or by the caller: workers open a memory-mapped
+        table by its file name and inherit any other kind from the fork.
+    :arg:
+        coords (list): List of [x, y] points
+    :arg:
+        restarts (int): Number of restarts
+            (default is 8)
+    :arg:
+        workers (int): Worker processes, 1 runs in this process
+            (default is os.cpu_count())
+    :arg:
+        seed (int): Seed of the first restart
+            (default is 0)
+    :arg:
+        target (int): Stop as soon as a tour this short is found
+            (default is None)
+    :arg:
+        time_limit (float): Stop after this many seconds
+            (default is None)
+    :arg:
+        max_depth (int): Deepest k-opt move to try
+    :arg:
+        breadth (tuple): Alternatives tried per level
+    :arg:
+        or_opt (bool): Interleave or-opt passes
+            (default is False)
+    :arg:
+        budget (Budget): Deadline and Ctrl-C state, replaces time_limit
+            (default is None)
+    :arg:
+        graph (obj): Instance of coords with dist and cand already built, see tspSolver.prepare
+            (default is None, built here)
+    :return:
+        list, int: best closed tour (first town repeated at the end), its length
+    """
+    if graph is None:
+        with tempfile.TemporaryDirectory() as tmp:
+            graph = LKTsp(len(coords))
+            graph.g = coords
+            # A mapped table gets a name in tmp for the workers, removed with tmp
+            prepare(graph, path=os.path.join(tmp, "dist.bin"))
+            return parallel_lk(coords, restarts, workers, seed, target, time_limit,
+                               max_depth, breadth, or_opt, budget, graph)
+    dist = graph.dist_path or graph.dist
+    workers = workers or os.cpu_count() or 1
+    seeds = [seed + i for i in range(restarts)]
+    if budget is None:
+        budget = Budget(time_limit)
+    best = None
+
+    def done(res):
+        return target is not None and res[0] <= target
+
+    if workers <= 1 or restarts <= 1:
+        lk_worker_init(coords, max_depth, breadth, or_opt, budget, dist=graph.dist, cand=graph.cand)
+        for s in seeds:
+            if best is not None and budget.expired():
                 break
-        curr_edge[i] = None
-        j = 2
-        while True:
-            k = 0
-            if j >= ln:
+            res = lk_restart(s)
+            if best is None or res[0] < best[0]:
+                best = res
+            if done(best):
                 break
-            for k in range(0, len(self.ids)):
-                if curr_edge[j] is None:
-                    continue
-                e = curr_edge[j]
-                x, y = self.ids[k]
-                if e is not None and e.v1 == x:
-                    end = k
+    else:
+        pool = multiprocessing.Pool(min(workers, restarts), lk_worker_init,
+                                    (coords, max_depth, breadth, or_opt, budget, True, dist, graph.cand))
+        finished = True
+        try:
+            results = pool.imap_unordered(lk_restart, seeds)
+            got = 0
+            while got < len(seeds):
+                # Always wait for a first tour, there is nothing to return before it
+                if best is not None and budget.expired():
+                    finished = False
                     break
-                elif e is not None and e.v2 == y:
-                    end = k
+                try:
+                    # Short waits, so a deadline or Ctrl-C is noticed
+                    res = results.next(POLL)
+                except multiprocessing.TimeoutError:
+                    continue
+                got += 1
+                profiler.merge(res[3])
+                if best is None or res[0] < best[0] or (res[0] == best[0] and res[2] < best[2]):
+                    best = res
+                if done(best):
+                    finished = False
                     break
-            if j == len(curr_edge):
-                break
-
-            curr_edge[j] = None
-
-            tour[j] = end
-            j += 1
-
-        return tour
-
-
+        finally:
+            # Kill restarts still running or queued
+            if finished:
+                pool.close()
+            else:
+                pool.terminate()
+            pool.join()
 
-def get_tour_prime(tour_idx, i):
-    return tour_idx[0:i+2]
+    if best is None:
+        return [], 0
+    tour = best[1]
+    return tour + tour[:1], best[0]
 
 
-def next_node(curr, edge):
-    return edge[0] if curr == edge[1] else edge[1]
+def edge_key(i, j, n):
+    # Integer key of the undirected edge (i, j) among n towns
+    return i*n+j if i < j else j*n+i
 
 
 def remove_edge(queue, to_rm):
@@ -422,7 +477,8 @@ def remove_edge(queue, to_rm):
 
 
 def to_hungarian(obj):
-    return Hungarian(obj.get_length(), obj.dist)
+    # Hungarian rewrites cells with sys.maxsize, so it needs the list form
+    return Hungarian(obj.get_length(), as_lists(obj.dist))
 
 
 def transpose(m):
@@ -444,20 +500,6 @@ def lower_right(a, n):
     return [[a[i][j] for j in range(len(a)-n, len(a))] for i in range(len(a)-n, len(a))]
 
 
-class Edge:
-    # v1: vertex 1
-    # v2: vertex 2
-    def __init__(self, i, j):
-        self.v1 = i if i > j else j
-        self.v2 = j if i > j else i
-
-    def __eq__(self, other):
-        if self.v1 == other.v1 and self.v2 == other.v2:
-            return True
-        else:
-            return False
-
-
 class Hungarian:
     def __init__(self, k, dist):
         self._k = k
@@ -738,4 +780,3 @@ class Hungarian:
         return tour
 
 
-
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+from collections import deque
+from tour import two_opt_move
+import profiler
+from budget import expired
+
+
+def two_opt(tour, dist, cand, queue=None, budget=None):
+    """ Neighbor list 2-opt with don't-look bits.
+        Only cities in the queue are looked at; a city leaves the queue when no
+        improving move starts from it and comes back when one of its tour edges changes.
+    :param:
+        tour (Tour or TwoLevelTour): Tour to improve in place
+    :param:
+        dist: Distance table or provider, dist[i][j]
+    :param:
+        cand (CandidateSet): Candidate neighbors, nearest first
+    :param:
+        queue (list): Cities to start from
+            (default is every city in tour order)
+    :param:
+        budget (Budget): Stop early once expired, the tour is valid after every move
+            (default is None)
+    :return:
+        int: total gain, the tour got this much shorter
+    """
+    active = deque(tour if queue is None else queue)
+    in_queue = bytearray(len(tour))
+    for c in active:
+        in_queue[c] = 1
+    gain = 0
+    tried = applied = 0
+
+    while active:
+        if expired(budget):
+            break
+        a = active.popleft()
+        in_queue[a] = 0
+        nbrs = cand.neighbors(a)
+        nbr_dists = cand.neighbor_dists(a)
+        move = None
+        for forward in (True, False):
+            b = tour.next(a) if forward else tour.prev(a)
+            d_ab = dist[a][b]
+            for c, d_ac in zip(nbrs, nbr_dists):
+                # Sorted candidates, once d(a, c) >= d(a, b) no move can gain
+                if d_ac >= d_ab:
+                    break
+                d = tour.next(c) if forward else tour.prev(c)
+                if c == b or d == a:
+                    continue
+                tried += 1
+                delta = d_ab + dist[c][d] - d_ac - dist[b][d]
+                if delta > 0:
+                    move = forward, b, c, d, delta
+                    break
+            if move is not None:
+                break
+        if move is None:
+            continue
+
+        forward, b, c, d, delta = move
+        # (a, b), (c, d) become (a, c), (b, d)
+        if forward:
+            tour.flip(b, c)
+        else:
+            tour.flip(a, d)
+        gain += int(delta)
+        applied += 1
+        for x in (a, b, c, d):
+            if not in_queue[x]:
+                in_queue[x] = 1
+                active.append(x)
+    profiler.count("two_opt.tried", tried)
+    profiler.count("two_opt.applied", applied)
+    return gain
+
+
+def or_opt(tour, dist, cand, queue=None, max_len=3, budget=None):
+    """ Or-opt, moves a segment of 1 to max_len cities to a better place, possibly reversed.
+        Segments start at a queued city and run either way along the tour,
+        they are put next to a candidate neighbor of one of their ends.
+        The best try for each segment is applied, cities near a change are queued again.
+    :param:
+        tour (Tour or TwoLevelTour): Tour to improve in place
+    :param:
+        dist: Distance table or provider, dist[i][j]
+    :param:
+        cand (CandidateSet): Candidate neighbors, nearest first
+    :param:
+        queue (list): Cities to start from
+            (default is every city in tour order)
+    :param:
+        max_len (int): Longest segment moved
+            (default is 3)
+    :param:
+        budget (Budget): Stop early once expired
+            (default is None)
+    :return:
+        int: total gain, the tour got this much shorter
+    """
+    n = len(tour)
+    if n < max_len + 3:
+        max_len = n - 3
+    active = deque(tour if queue is None else queue)
+    in_queue = bytearray(n)
+    for c in active:
+        in_queue[c] = 1
+    gain = 0
+    tried = applied = 0
+
+    while active:
+        if expired(budget):
+            break
+        s1 = active.popleft()
+        in_queue[s1] = 0
+        best = None
+        for forward in (True, False):
+            nxt = tour.next if forward else tour.prev
+            prv = tour.prev if forward else tour.next
+            p = prv(s1)
+            seg = [s1]
+            for _ in range(max_len):
+                sk = seg[-1]
+                q = nxt(sk)
+                removed = dist[p][s1] + dist[sk][q] - dist[p][q]
+                if removed > 0:
+                    tried += 1
+                    move = best_insertion(dist, cand, nxt, prv, seg, removed)
+                    if move is not None and (best is None or move[0] > best[0]):
+                        best = move + (p, q)
+                seg.append(q)
+
+        if best is None:
+            continue
+        delta, s1, sk, u, v, same, p, q = best
+        # Cut the segment out and put it back reversed between u and v
+        two_opt_move(tour, p, s1, u, v)
+        two_opt_move(tour, p, u, q, sk)
+        if same:
+            two_opt_move(tour, u, sk, s1, v)
+        gain += int(delta)
+        applied += 1
+        for x in (p, q, s1, sk, u, v):
+            if not in_queue[x]:
+                in_queue[x] = 1
+                active.append(x)
+    profiler.count("or_opt.tried", tried)
+    profiler.count("or_opt.applied", applied)
+    return gain
+
+
+def best_insertion(dist, cand, nxt, prv, seg, removed):
+    """ Function to find the best place for a segment among candidate neighbors of its ends
+    :param:
+        dist: Distance table or provider, dist[i][j]
+    :param:
+        cand (CandidateSet): Candidate neighbors, nearest first
+    :param:
+        nxt (function): Successor along the direction seg was built in
+    :param:
+        prv (function): Predecessor along that direction
+    :param:
+        seg (list): Segment cities, seg[0] .. seg[-1] in that direction
+    :param:
+        removed (int): Gain of cutting seg out and joining its neighbors
+    :return:
+        tuple: (delta, s1, sk, u, v, same orientation) of the best try, None if none gains
+    """
+    s1, sk = seg[0], seg[-1]
+    p = prv(s1)
+    best = None
+    for end in (s1, sk):
+        for c, d_c in zip(cand.neighbors(end), cand.neighbor_dists(end)):
+            # Adding (end, c) alone already eats the gain
+            if d_c >= removed:
+                break
+            if c in seg:
+                continue
+            # Edge (u, v) with v after u, on either side of c
+            for u, v in ((c, nxt(c)), (prv(c), c)):
+                # Skip the segment's own edges, and (prv(p), p) where the moves degenerate
+                if v == s1 or u == sk or v == p:
+                    continue
+                d_uv = dist[u][v]
+                rev = removed - (dist[u][sk] + dist[s1][v] - d_uv)
+                same = removed - (dist[u][s1] + dist[sk][v] - d_uv)
+                if rev > 0 and (best is None or rev > best[0]):
+                    best = (rev, s1, sk, u, v, False)
+                if same > 0 and (best is None or same > best[0]):
+                    best = (same, s1, sk, u, v, True)
+    return best
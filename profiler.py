@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+import json, sys, tracemalloc
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from functools import wraps
+from time import perf_counter
+
+# The running Profiler, None when profiling is off. Hot loops keep plain local
+# counters and hand them over once per call through count(), so a disabled
+# profiler costs one global lookup per call.
+active = None
+
+
+def count(name, k=1):
+    """ Function to add to a counter of the running profiler, no-op when profiling is off
+    :param:
+        name (string): Counter name
+    :param:
+        k (int): Amount to add
+            (default is 1)
+    :return:
+        void
+    """
+    if active is not None:
+        active.counters[name] += k
+
+
+def phase(name):
+    """ Function to time a phase on the running profiler
+    :param:
+        name (string): Phase name
+    :return:
+        context manager: a null context when profiling is off
+    """
+    return active.phase(name) if active is not None else nullcontext()
+
+
+def worker_start():
+    """ Function to reset profiling in a forked pool worker. The worker inherits the
+        running profiler and tracemalloc, tracing is stopped and counts go to a
+        profiler of its own, handed back with take_counts().
+    :return:
+        void
+    """
+    global active
+    if active is None:
+        return
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+    active = Profiler(memory=False)
+
+
+def take_counts():
+    """ Function to hand over the counters of the running profiler and clear them
+    :return:
+        Counter: counts since the last call, None when profiling is off
+    """
+    if active is None:
+        return None
+    counts = Counter(active.counters)
+    # Cleared in place, CountingDistance and the wrappers hold this Counter
+    active.counters.clear()
+    return counts
+
+
+def merge(counts):
+    """ Function to add the counts of a worker to the running profiler
+    :param:
+        counts (Counter): Output of take_counts() in the worker, None is ignored
+    :return:
+        void
+    """
+    if active is not None and counts:
+        active.counters.update(counts)
+
+
+class Profiler:
+    """
+    Per-phase wall time, plus named counters.
+    A phase entered twice adds up. Phases may nest, an outer phase then
+    includes the time and memory peak of the phases inside it.
+    With memory=True each phase also gets its tracemalloc peak, but tracing slows
+    the hot loops down many times over, so its phase times are not real times.
+    """
+    def __init__(self, memory=False):
+        self.memory = memory
+        self.phases = {}
+        self.counters = Counter()
+        self.t_start = perf_counter()
+        # [bytes at start, peak above it] of every phase running, outermost first
+        self.open = []
+
+    def start(self):
+        """ Function to make this the running profiler
+        :return:
+            Profiler: self
+        """
+        global active
+        active = self
+        if self.memory:
+            tracemalloc.start()
+        return self
+
+    def stop(self):
+        global active
+        if active is self:
+            active = None
+        if self.memory and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    @contextmanager
+    def phase(self, name):
+        if self.memory:
+            # Tracing stopped by other code is started again
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            cur, peak = tracemalloc.get_traced_memory()
+            # reset_peak below would hide the peak so far from the phases around this one
+            self.fold(peak)
+            tracemalloc.reset_peak()
+            frame = [cur, 0]
+            self.open.append(frame)
+        t1_start = perf_counter()
+        try:
+            yield
+        finally:
+            p = self.phases.setdefault(name, {"seconds": 0.0, "calls": 0})
+            p["seconds"] += perf_counter() - t1_start
+            p["calls"] += 1
+            if self.memory:
+                # Peak above what was allocated when the phase started
+                self.fold(tracemalloc.get_traced_memory()[1])
+                self.open.pop()
+                p["peak_bytes"] = max(p.get("peak_bytes", 0), frame[1])
+
+    def fold(self, peak):
+        # Add a traced peak to every running phase
+        for frame in self.open:
+            frame[1] = max(frame[1], peak - frame[0])
+
+    def report(self):
+        """ Function to build the report
+        :return:
+            dict: total seconds, phases and counters
+        """
+        return {"total_seconds": perf_counter() - self.t_start,
+                "phases": self.phases,
+                "counters": dict(sorted(self.counters.items()))}
+
+    def write(self, path):
+        """ Function to write the report as json
+        :param:
+            path (string): Output file, "-" for stderr, stdout carries the solver output
+        :return:
+            void
+        """
+        text = json.dumps(self.report(), indent=1)
+        if path == "-":
+            print(text, file=sys.stderr)
+        else:
+            with open(path, 'w') as w:
+                w.write(text + "\n")
+
+
+class CountingDistance:
+    """
+    Distance table proxy counting dist[i][j] lookups as "distance.lookups".
+    Only put in place while profiling, the solvers get the bare table otherwise.
+    """
+    def __init__(self, table, counters):
+        self.table = table
+        self.counters = counters
+
+    def __len__(self):
+        return len(self.table)
+
+    def __getitem__(self, i):
+        self.counters["distance.lookups"] += 1
+        return self.table[i]
+
+    def __iter__(self):
+        return iter(self.table)
+
+
+class CountingCandidates:
+    """
+    Candidate set proxy counting neighbors(i) lookups as "candidates.lookups",
+    the candidate list reads of lk_step, two_opt and or_opt.
+    """
+    def __init__(self, cand, counters):
+        self.cand = cand
+        self.counters = counters
+
+    def __len__(self):
+        return len(self.cand)
+
+    # Flat arrays read directly by the constructions, not counted
+    k = property(lambda self: self.cand.k)
+    n = property(lambda self: self.cand.n)
+    ids = property(lambda self: self.cand.ids)
+    dists = property(lambda self: self.cand.dists)
+
+    def neighbors(self, i):
+        self.counters["candidates.lookups"] += 1
+        return self.cand.neighbors(i)
+
+    def neighbor_dists(self, i):
+        return self.cand.neighbor_dists(i)
+
+
+def counting(fn, name, counters, applied=None):
+    """ Function to wrap a method so its calls are counted
+    :param:
+        fn (function): Bound method
+    :param:
+        name (string): Counter of calls
+    :param:
+        counters (Counter): Counters to add to
+    :param:
+        applied (string): Counter of calls returning a positive gain
+            (default is None)
+    :return:
+        function: wrapper
+    """
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        counters[name] += 1
+        res = fn(*args, **kwargs)
+        if applied is not None and res > 0:
+            counters[applied] += 1
+        return res
+    return wrapper
+
+
+def instrument(g):
+    """ Function to count the hot operations of a prepared instance while profiling.
+        Distance lookups go through CountingDistance, candidate list lookups through
+        CountingCandidates, an LKTsp also counts lk searches tried and applied and lk flips.
+    :param:
+        g (Distance or LKTsp): Instance with dist set
+    :return:
+        void
+    """
+    if active is None:
+        return
+    c = active.counters
+    if not isinstance(g.dist, CountingDistance):
+        g.dist = CountingDistance(g.dist, c)
+    if g.cand is not None and not isinstance(g.cand, CountingCandidates):
+        g.cand = CountingCandidates(g.cand, c)
+    if hasattr(g, "lk_step"):
+        g.lk = counting(g.lk, "lk.tried", c, "lk.applied")
+        g.lk_flip = counting(g.lk_flip, "lk.flips", c)
@@ -0,0 +1,537 @@
+#!/usr/bin/env python3
+import math, os
+from array import array
+from bisect import bisect_right
+
+try:
+    import numpy as np
+except ImportError:     # numpy is optional, tour_length falls back to a loop
+    np = None
+
+
+# From this many cities make_tour picks TwoLevelTour (see tourBenchmark.py,
+# ~1000 from a random start, ~5000-10000 from a constructed one)
+TWO_LEVEL_LIMIT = 5000
+
+# Cross-check the kept tour length against a full recomputation after every flip.
+# O(n) per flip, for debugging only, set TSP_DEBUG_TOUR=1 to turn it on.
+DEBUG_LENGTH = bool(os.environ.get("TSP_DEBUG_TOUR"))
+
+
+def tour_length(order, dist):
+    """ Function to sum the edges of a tour, vectorized for numpy tables
+    :param:
+        order (sequence): City ids in tour order, not closed
+    :param:
+        dist: Distance table or provider, dist[i][j]
+    :return:
+        int: length of the closed tour
+    """
+    n = len(order)
+    if n < 2:
+        return 0
+    if np is not None and isinstance(dist, np.ndarray):
+        o = np.asarray(order, dtype=np.intp)
+        return int(dist[o, np.roll(o, -1)].sum(dtype=np.int64))
+    return sum(int(dist[order[i-1]][order[i]]) for i in range(n))
+
+
+def is_valid_tour(order, n):
+    """ Function to check that order visits cities 0..n-1 once each, O(n) with a visited bitmap
+    :param:
+        order (sequence): City ids in tour order, not closed
+    :param:
+        n (int): Number of cities
+    :return:
+        bool: True for a permutation of range(n)
+    """
+    if len(order) != n:
+        return False
+    seen = bytearray(n)
+    for c in order:
+        if not 0 <= c < n or seen[c]:
+            return False
+        seen[c] = 1
+    return True
+
+
+def check_closed_tour(tour):
+    """ Function to check a solver result before it is written
+    :param:
+        tour (list): Closed tour, first city repeated at the end, empty for no cities
+    :return:
+        void: raises ValueError if tour is not a closed permutation of 0..n-1
+    """
+    if not tour:
+        return
+    if tour[0] != tour[-1] or not is_valid_tour(tour[:-1], len(tour) - 1):
+        raise ValueError("Invalid tour: cities 0..%d must each appear once, closed at the first city"
+                         % (len(tour) - 2))
+
+
+def tour_from_edges(edges, n):
+    """ Function to rebuild a tour from its edges in O(n).
+        Neighbors go into a flat adjacency array, two slots per city, then the
+        cycle is walked from city 0.
+    :param:
+        edges (iterable): Undirected edges as keys i*n+j, i < j (lin_kernighan.edge_key)
+    :param:
+        n (int): Number of cities
+    :return:
+        list: City ids in tour order, None if the edges are not one cycle through every city
+    """
+    if n < 3:
+        return list(range(n))
+    adj = array('i', [-1]) * (2 * n)
+    m = 0
+    for key in edges:
+        i, j = divmod(key, n)
+        # First free slot of each end, a third neighbor means it is not a tour
+        i2, j2 = 2*i, 2*j
+        if adj[i2] != -1:
+            i2 += 1
+            if adj[i2] != -1:
+                return None
+        if adj[j2] != -1:
+            j2 += 1
+            if adj[j2] != -1:
+                return None
+        adj[i2] = j
+        adj[j2] = i
+        m += 1
+    # n edges with no degree above 2 leave every city with degree 2
+    if m != n:
+        return None
+    order = []
+    prev, curr = -1, 0
+    for _ in range(n):
+        order.append(curr)
+        a = adj[2*curr]
+        prev, curr = curr, (adj[2*curr+1] if a == prev else a)
+    # Several cycles come back to 0 early and repeat cities
+    if curr != 0 or not is_valid_tour(order, n):
+        return None
+    return order
+
+
+class Length:
+    """
+    Incremental tour length shared by both tour backends.
+    With a distance table, flip() updates length from the four edges it changes,
+    so reading it is O(1). Without one, length stays None.
+    """
+    def init_length(self, dist):
+        self.dist = dist
+        self.length = tour_length(self.to_list(), dist) if dist is not None else None
+        # v[i, j] on a memoryview is several times faster than dist[i][j] on numpy
+        self.view = memoryview(dist) if np is not None and isinstance(dist, np.ndarray) else None
+
+    def edge_delta(self, p, a, b, q):
+        """ Function to get the length change of swapping (p, a), (b, q) for (p, b), (a, q)
+        :param:
+            p (int): City before a
+        :param:
+            a (int): First city of the flipped path
+        :param:
+            b (int): Last city of the flipped path
+        :param:
+            q (int): City after b
+        :return:
+            int: new length minus old length
+        """
+        v = self.view
+        if v is not None:
+            return v[p, b] + v[a, q] - v[p, a] - v[b, q]
+        d = self.dist
+        return int(d[p][b]) + int(d[a][q]) - int(d[p][a]) - int(d[b][q])
+
+    def check_length(self):
+        """ Function to compare the kept length with a full recomputation
+        :return:
+            int: the length
+        """
+        full = tour_length(self.to_list(), self.dist)
+        if full != self.length:
+            raise ValueError("Tour length drifted: kept %d, actual %d" % (self.length, full))
+        return full
+
+
+class Tour(Length):
+    """
+    Array backed tour.
+    order[p] is the city at position p, pos[c] is the position of city c,
+    so next, prev, between and position lookups are O(1).
+    """
+    def __init__(self, order, dist=None):
+        self.n = len(order)
+        self.order = array('i', order)
+        self.pos = array('i', [0]) * self.n
+        for p, c in enumerate(self.order):
+            self.pos[c] = p
+        self.init_length(dist)
+
+    def __len__(self):
+        return self.n
+
+    def __getitem__(self, p):
+        return self.order[p]
+
+    def __iter__(self):
+        return iter(self.order)
+
+    def to_list(self):
+        return self.order.tolist()
+
+    def position(self, c):
+        """ Function to get the position of a city in the tour
+        :param:
+            c (int): City id
+        :return:
+            int: position of c
+        """
+        return self.pos[c]
+
+    def next(self, c):
+        """ Function to get the city after c
+        :param:
+            c (int): City id
+        :return:
+            int: successor of c
+        """
+        p = self.pos[c] + 1
+        return self.order[0 if p == self.n else p]
+
+    def prev(self, c):
+        """ Function to get the city before c
+        :param:
+            c (int): City id
+        :return:
+            int: predecessor of c
+        """
+        return self.order[self.pos[c] - 1]
+
+    def between(self, a, b, c):
+        """ Function to check if b is on the forward path from a to c, ends included
+        :param:
+            a (int): City id
+        :param:
+            b (int): City id
+        :param:
+            c (int): City id
+        :return:
+            bool: True if a -> ... -> b -> ... -> c
+        """
+        pa, pb, pc = self.pos[a], self.pos[b], self.pos[c]
+        if pa <= pc:
+            return pa <= pb <= pc
+        return pb >= pa or pb <= pc
+
+    def flip(self, a, b):
+        """ Function to reverse the forward path from a to b (2-opt move).
+            The edges (prev(a), a) and (b, next(b)) become (prev(a), b) and (a, next(b)).
+            The shorter side is reversed, which gives the same cyclic tour.
+        :param:
+            a (int): First city of the path
+        :param:
+            b (int): Last city of the path
+        :return:
+            void
+        """
+        n = self.n
+        i, j = self.pos[a], self.pos[b]
+        ln = (j - i) % n + 1
+        # Reversing the whole tour changes nothing
+        if self.length is not None and ln < n:
+            self.length += self.edge_delta(self.order[i - 1], a, b, self.order[(j + 1) % n])
+        if 2 * ln > n:
+            # Reverse the complement next(b) .. prev(a) instead
+            i, j = j + 1, i - 1
+            ln = n - ln
+        order, pos = self.order, self.pos
+        for _ in range(ln // 2):
+            i %= n
+            j %= n
+            ci, cj = order[i], order[j]
+            order[i], order[j] = cj, ci
+            pos[cj], pos[ci] = i, j
+            i += 1
+            j -= 1
+        if DEBUG_LENGTH and self.length is not None:
+            self.check_length()
+
+
+class _Segment:
+    """
+    Segment of a TwoLevelTour. cities is read backwards when rev is set,
+    rank is the index in the segment list and offset the position of its first city.
+    """
+    __slots__ = ('cities', 'rev', 'rank', 'offset')
+
+    def __init__(self, cities):
+        self.cities = cities
+        self.rev = False
+        self.rank = 0
+        self.offset = 0
+
+
+class TwoLevelTour(Length):
+    """
+    Two-level list tour for large instances.
+    The tour is cut into about sqrt(n) segments with a reversal bit each, so a
+    flip splits at most two segments and reverses the segment list in O(sqrt(n))
+    instead of moving O(n) cities. Same API as Tour.
+    """
+    def __init__(self, order, group=0, dist=None):
+        self.n = len(order)
+        self.group = group if group > 0 else max(8, int(math.sqrt(self.n)))
+        self.seg_of = [None] * self.n
+        self.idx = array('i', [0]) * self.n
+        self.segs = []
+        self.offsets = []
+        for lo in range(0, self.n, self.group):
+            s = _Segment(list(order[lo:lo + self.group]))
+            self.segs.append(s)
+            self.attach(s)
+        self.renumber()
+        self.init_length(dist)
+
+    def __len__(self):
+        return self.n
+
+    def __getitem__(self, p):
+        s = self.segs[bisect_right(self.offsets, p) - 1]
+        k = p - s.offset
+        return s.cities[len(s.cities) - 1 - k] if s.rev else s.cities[k]
+
+    def __iter__(self):
+        for s in self.segs:
+            yield from (reversed(s.cities) if s.rev else s.cities)
+
+    def to_list(self):
+        return list(self)
+
+    def attach(self, s):
+        # Point every city of s back at it
+        for i, c in enumerate(s.cities):
+            self.seg_of[c] = s
+            self.idx[c] = i
+
+    def renumber(self):
+        off = 0
+        self.offsets = []
+        for r, s in enumerate(self.segs):
+            s.rank = r
+            s.offset = off
+            self.offsets.append(off)
+            off += len(s.cities)
+
+    def oriented(self, c):
+        # Index of c in its segment, in tour direction
+        s = self.seg_of[c]
+        return len(s.cities) - 1 - self.idx[c] if s.rev else self.idx[c]
+
+    def position(self, c):
+        """ Function to get the position of a city in the tour
+        :param:
+            c (int): City id
+        :return:
+            int: position of c
+        """
+        return self.seg_of[c].offset + self.oriented(c)
+
+    def next(self, c):
+        """ Function to get the city after c
+        :param:
+            c (int): City id
+        :return:
+            int: successor of c
+        """
+        s = self.seg_of[c]
+        i = self.idx[c]
+        cs = s.cities
+        if s.rev:
+            if i > 0:
+                return cs[i - 1]
+        elif i + 1 < len(cs):
+            return cs[i + 1]
+        t = self.segs[s.rank + 1] if s.rank + 1 < len(self.segs) else self.segs[0]
+        return t.cities[-1] if t.rev else t.cities[0]
+
+    def prev(self, c):
+        """ Function to get the city before c
+        :param:
+            c (int): City id
+        :return:
+            int: predecessor of c
+        """
+        s = self.seg_of[c]
+        i = self.idx[c]
+        cs = s.cities
+        if s.rev:
+            if i + 1 < len(cs):
+                return cs[i + 1]
+        elif i > 0:
+            return cs[i - 1]
+        t = self.segs[s.rank - 1]
+        return t.cities[0] if t.rev else t.cities[-1]
+
+    def between(self, a, b, c):
+        """ Function to check if b is on the forward path from a to c, ends included
+        :param:
+            a (int): City id
+        :param:
+            b (int): City id
+        :param:
+            c (int): City id
+        :return:
+            bool: True if a -> ... -> b -> ... -> c
+        """
+        pa, pb, pc = self.position(a), self.position(b), self.position(c)
+        if pa <= pc:
+            return pa <= pb <= pc
+        return pb >= pa or pb <= pc
+
+    def split(self, s, k):
+        """ Function to cut segment s before its k-th city (tour direction).
+            Ranks and offsets are stale until the caller renumbers.
+        :param:
+            s (_Segment): Segment to cut, 0 < k < len(s.cities)
+        :param:
+            k (int): Oriented index of the first city of the new segment
+        :return:
+            void
+        """
+        if s.rev:
+            s.cities.reverse()
+            s.rev = False
+            self.attach(s)
+        t = _Segment(s.cities[k:])
+        del s.cities[k:]
+        self.attach(t)
+        self.segs.insert(self.segs.index(s) + 1, t)
+
+    def merge(self, s):
+        """ Function to merge segment s with the following segment
+        :param:
+            s (_Segment): Segment to merge
+        :return:
+            void
+        """
+        t = self.segs[(s.rank + 1) % len(self.segs)]
+        s.cities = (s.cities[::-1] if s.rev else s.cities) + (t.cities[::-1] if t.rev else t.cities)
+        s.rev = False
+        self.attach(s)
+        self.segs.remove(t)
+        self.renumber()
+
+    def rebalance(self, s):
+        # Merge a segment left too small by a split into its smaller neighbor
+        m = len(self.segs)
+        if m < 2 or len(s.cities) >= self.group // 2:
+            return
+        p = self.segs[s.rank - 1]
+        q = self.segs[(s.rank + 1) % m]
+        if len(p.cities) <= len(q.cities):
+            if len(p.cities) + len(s.cities) <= 2 * self.group:
+                self.merge(p)
+        elif len(q.cities) + len(s.cities) <= 2 * self.group:
+            self.merge(s)
+
+    def flip(self, a, b):
+        """ Function to reverse the forward path from a to b (2-opt move).
+            The edges (prev(a), a) and (b, next(b)) become (prev(a), b) and (a, next(b)).
+            The shorter side is reversed, which gives the same cyclic tour.
+        :param:
+            a (int): First city of the path
+        :param:
+            b (int): Last city of the path
+        :return:
+            void
+        """
+        p = self.prev(a)
+        if self.length is not None and p != b:
+            self.length += self.edge_delta(p, a, b, self.next(b))
+        self.flip_segments(a, b)
+        if DEBUG_LENGTH and self.length is not None:
+            self.check_length()
+
+    def flip_segments(self, a, b):
+        # flip without the length bookkeeping
+        n = self.n
+        ln = (self.position(b) - self.position(a)) % n + 1
+        if 2 * ln > n:
+            a, b = self.next(b), self.prev(a)
+            ln = n - ln
+        if ln < 2:
+            return
+        s = self.seg_of[a]
+        if s is self.seg_of[b] and self.oriented(a) <= self.oriented(b):
+            # Path inside one segment, reverse the cities in place
+            lo, hi = sorted((self.idx[a], self.idx[b]))
+            s.cities[lo:hi + 1] = s.cities[hi:lo - 1 if lo else None:-1]
+            for i in range(lo, hi + 1):
+                self.idx[s.cities[i]] = i
+            return
+        # Cut so the path is made of whole segments
+        if self.oriented(a) > 0:
+            self.split(s, self.oriented(a))
+        s = self.seg_of[b]
+        if self.oriented(b) < len(s.cities) - 1:
+            self.split(s, self.oriented(b) + 1)
+        # Reverse the order and orientation of segments rank(a) .. rank(b)
+        segs = self.segs
+        m = len(segs)
+        i, j = segs.index(self.seg_of[a]), segs.index(self.seg_of[b])
+        cnt = (j - i) % m + 1
+        for k in range(cnt):
+            segs[(i + k) % m].rev ^= True
+        for _ in range(cnt // 2):
+            i %= m
+            j %= m
+            segs[i], segs[j] = segs[j], segs[i]
+            i += 1
+            j -= 1
+        self.renumber()
+        self.rebalance(self.seg_of[a])
+        self.rebalance(self.seg_of[b])
+
+
+def make_tour(order, two_level=None, dist=None):
+    """ Function to create the tour backend that suits the instance size
+    :param:
+        order (list): City ids in tour order
+    :param:
+        two_level (bool): Force a backend, None picks by size
+            (default is None)
+    :param:
+        dist: Distance table, the tour then keeps its length up to date
+            (default is None)
+    :return:
+        Tour or TwoLevelTour
+    """
+    if two_level is None:
+        two_level = len(order) >= TWO_LEVEL_LIMIT
+    return TwoLevelTour(order, dist=dist) if two_level else Tour(order, dist)
+
+
+def two_opt_move(tour, a, b, c, d):
+    """ Function to swap edges (a, b), (c, d) for (a, c), (b, d) on any tour backend.
+        b must follow a exactly when d follows c, the orientation itself does not
+        matter, so moves can be chained after flips that reversed the tour.
+    :param:
+        tour (Tour or TwoLevelTour): Tour to change in place
+    :param:
+        a (int): City id
+    :param:
+        b (int): City next to a
+    :param:
+        c (int): City id
+    :param:
+        d (int): City next to c, same side as b is to a
+    :return:
+        void
+    """
+    if tour.next(a) == b:
+        tour.flip(b, c)
+    else:
+        tour.flip(a, d)
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+from tour import Tour, TwoLevelTour
+from candidateSet import CandidateSet
+from tspMain import read_file, process_lines
+import os, random, sys
+from time import perf_counter
+
+# Usage: python3 tourBenchmark.py [flips] [n1 n2 ...]
+
+
+def strip_order(coords):
+    """ Function to build a cheap starting tour, boustrophedon over horizontal strips
+    :param:
+        coords (list): List of [x, y] points
+    :return:
+        list: city ids in tour order
+    """
+    n = len(coords)
+    ys = [y for x, y in coords]
+    lo, hi = min(ys), max(ys)
+    strips = max(1, int(n ** 0.5 / 2))
+    h = (hi - lo) / strips or 1
+
+    def key(c):
+        s = min(int((coords[c][1] - lo) / h), strips - 1)
+        return s, coords[c][0] if s % 2 == 0 else -coords[c][0]
+    return sorted(range(n), key=key)
+
+
+def time_flips(tour, moves):
+    """ Function to time a list of 2-opt moves on a tour backend
+    :param:
+        tour (Tour or TwoLevelTour): Tour to flip
+    :param:
+        moves (list): (a, c) pairs, each adds edge (a, c)
+    :return:
+        float: seconds per flip
+    """
+    t1_start = perf_counter()
+    for a, c in moves:
+        b = tour.next(a)
+        if c != b and c != tour.prev(a):
+            tour.flip(b, c)
+    return (perf_counter() - t1_start) / len(moves)
+
+
+def bench(coords, flips, start):
+    """ Function to compare both tour backends on one instance
+    :param:
+        coords (list): List of [x, y] points
+    :param:
+        flips (int): Number of moves to time
+    :param:
+        start (string): "random" for a shuffled start tour (LKTsp.init_tour),
+            "strip" for a good constructed one
+    :return:
+        float, float: seconds per flip for Tour, TwoLevelTour
+    """
+    rnd = random.Random(len(coords))
+    if start == "random":
+        order = list(range(len(coords)))
+        rnd.shuffle(order)
+    else:
+        order = strip_order(coords)
+    cand = CandidateSet(coords, 5)
+    moves = []
+    for _ in range(flips):
+        a = rnd.randrange(len(coords))
+        moves.append((a, rnd.choice(cand.neighbors(a))))
+    return time_flips(Tour(order), moves), time_flips(TwoLevelTour(order), moves)
+
+
+def main(argv):
+    flips = int(argv[0]) if argv else 2000
+    sizes = [int(a) for a in argv[1:]] or [5000, 10000, 20000, 50000]
+
+    f_loc = os.path.join(os.path.dirname(os.path.abspath(__file__)), "example_graphs", "tsp_example_5.txt")
+    instances = [("tsp_example_5", process_lines(read_file(f_loc))[0].g)]
+    rnd = random.Random(0)
+    for n in sizes:
+        instances.append(("random_%d" % n, [[rnd.randint(0, 10*n), rnd.randint(0, 10*n)] for _ in range(n)]))
+
+    for start in ("random", "strip"):
+        print("\n%s start tour" % start)
+        print("%-16s %8s %12s %12s  %s" % ("instance", "n", "array us", "2-level us", "faster"))
+        crossover = None
+        for name, coords in instances:
+            arr, two = bench(coords, flips, start)
+            faster = "2-level" if two < arr else "array"
+            # Smallest size from which the two-level list stays faster
+            if two >= arr:
+                crossover = None
+            elif crossover is None:
+                crossover = len(coords)
+            print("%-16s %8d %12.1f %12.1f  %s" % (name, len(coords), arr*1e6, two*1e6, faster))
+        print("Crossover:", crossover if crossover is not None else "not reached")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
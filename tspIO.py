@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+import os, sys, struct
+from array import array
+from itertools import islice
+from tspSolver import Distance
+from tour import check_closed_tour
+
+try:
+    import numpy as np
+except ImportError:     # numpy is optional, blocks are parsed with map(int)
+    np = None
+
+
+# Header of the compact binary tour: magic, version, number of cities, weight
+BINARY_MAGIC = b"TSPT"
+BINARY_HEADER = struct.Struct("<4sIqq")
+
+
+def iter_instances(in_file, cls=Distance):
+    """ This function lazily reads every instance of a file, one at a time
+    :param:
+        in_file (string): name of file to be parsed
+    :param:
+        cls (class): Graph subclass to build, Distance or LKTsp
+            (default is Distance)
+    :return:
+        generator: graph objects, in file order
+    """
+    if in_file.lower().endswith(".tsp"):
+        yield read_tsplib(in_file, cls)
+        return
+    with open(in_file, 'r') as r:
+        yield from read_instances(r, cls)
+
+
+def read_instances(lines, cls=Distance):
+    """ This function parses "count, then id x y" instances from an iterable of lines
+    :param:
+        lines (iterable): Lines, a file object streams from disk
+    :param:
+        cls (class): Graph subclass to build
+            (default is Distance)
+    :return:
+        generator: graph objects, in order
+    """
+    it = iter(lines)
+    for line in it:
+        if not line.strip():
+            continue
+        # k: number of vertices
+        k = int(line)
+        yield parse_block(list(islice(it, k)), k, cls)
+
+
+def parse_block(block, k, cls=Distance):
+    """ This function parses the coordinate lines of one instance in bulk
+    :param:
+        block (list): k lines of "id x y"
+    :param:
+        k (int): number of vertices
+    :param:
+        cls (class): Graph subclass to build
+            (default is Distance)
+    :return:
+        obj: graph with g and ids filled in
+    """
+    words = " ".join(block).split()
+    try:
+        ids, coords = split_columns(words, int)
+    except ValueError:
+        # TSPLIB allows real coordinates, keep the integral ones as ints
+        ids, coords = split_columns(words, float)
+        ids = [int(c) for c in ids]
+        if all(x.is_integer() and y.is_integer() for x, y in coords):
+            coords = [[int(x), int(y)] for x, y in coords]
+    if len(coords) != k:
+        raise ValueError("Expected %d cities, found %d" % (k, len(coords)))
+    g = cls(k)
+    g.g = coords
+    g.ids = dict(zip(ids, map(tuple, coords)))
+    return g
+
+
+def split_columns(words, num):
+    """ Function to convert "id x y" words in bulk
+    :param:
+        words (list): 3 words per city
+    :param:
+        num (type): int or float
+    :return:
+        list, list: ids, [x, y] coordinates
+    """
+    if np is not None:
+        v = np.array(words, dtype=np.int64 if num is int else np.float64).reshape(-1, 3)
+        return v[:, 0].tolist(), v[:, 1:].tolist()
+    v = array('q' if num is int else 'd', map(num, words))
+    if len(v) % 3:
+        raise ValueError("Incomplete city line")
+    return v[0::3].tolist(), [list(p) for p in zip(v[1::3], v[2::3])]
+
+
+def read_tsplib(in_file, cls=Distance):
+    """ This function reads a TSPLIB EUC_2D .tsp file
+    :param:
+        in_file (string): name of file to be parsed
+    :param:
+        cls (class): Graph subclass to build
+            (default is Distance)
+    :return:
+        obj: graph, ids are the TSPLIB node numbers in file order
+    """
+    header = {}
+    with open(in_file, 'r') as r:
+        for line in r:
+            line = line.strip()
+            if line.startswith("NODE_COORD_SECTION"):
+                break
+            if not line or line == "EOF":
+                continue
+            key, _, val = line.partition(":")
+            header[key.strip().upper()] = val.strip()
+        else:
+            raise ValueError("No NODE_COORD_SECTION in %s" % in_file)
+        kind = header.get("EDGE_WEIGHT_TYPE", "EUC_2D").upper()
+        if kind != "EUC_2D":
+            raise ValueError("Only EUC_2D instances are supported, not %s" % kind)
+        k = int(header["DIMENSION"])
+        block = list(islice(r, k))
+    return parse_block(block, k, cls)
+
+
+def write_tour(out_file, tour, weight):
+    """ This function writes the plain format, weight then one city per line, in one call
+    :param:
+        out_file (string): Output file
+    :param:
+        tour (list): Closed tour, first city repeated at the end
+    :param:
+        weight (int): Total weight of the tour
+    :return:
+        void
+    """
+    check_closed_tour(tour)
+    lines = [str(weight)]
+    lines.extend(map(str, tour[:-1]))
+    lines.append("")
+    with open(out_file, 'w') as w:
+        w.write("\n".join(lines))
+
+
+def write_tsplib_tour(out_file, tour, weight, ids=None, name=None):
+    """ This function writes a TSPLIB .tour file in one call
+    :param:
+        out_file (string): Output file
+    :param:
+        tour (list): Closed tour of city indexes
+    :param:
+        weight (int): Total weight of the tour, written as a comment
+    :param:
+        ids (list): Node number of each index, ids[i] is written for city i
+            (default is None, index + 1 as TSPLIB numbers from 1)
+    :param:
+        name (string): Tour name
+            (default is None, the file name)
+    :return:
+        void
+    """
+    check_closed_tour(tour)
+    cities = tour[:-1]
+    nodes = [ids[c] for c in cities] if ids is not None else [c + 1 for c in cities]
+    name = name or os.path.splitext(os.path.basename(out_file))[0]
+    lines = ["NAME : %s" % name, "COMMENT : Length %d" % weight, "TYPE : TOUR",
+             "DIMENSION : %d" % len(nodes), "TOUR_SECTION"]
+    lines.extend(map(str, nodes))
+    lines.extend(("-1", "EOF", ""))
+    with open(out_file, 'w') as w:
+        w.write("\n".join(lines))
+
+
+def write_binary_tour(out_file, tour, weight):
+    """ This function writes the compact binary tour, a 24 byte header then int32 cities
+    :param:
+        out_file (string): Output file
+    :param:
+        tour (list): Closed tour, first city repeated at the end
+    :param:
+        weight (int): Total weight of the tour
+    :return:
+        void
+    """
+    check_closed_tour(tour)
+    cities = array('i', tour[:-1])
+    if sys.byteorder == "big":
+        cities.byteswap()
+    with open(out_file, 'wb') as w:
+        w.write(BINARY_HEADER.pack(BINARY_MAGIC, 1, len(cities), weight) + cities.tobytes())
+
+
+def read_binary_tour(in_file):
+    """ This function reads a tour written by write_binary_tour
+    :param:
+        in_file (string): Tour file
+    :return:
+        list, int: closed tour, its weight
+    """
+    with open(in_file, 'rb') as r:
+        data = r.read()
+    magic, version, n, weight = BINARY_HEADER.unpack_from(data)
+    if magic != BINARY_MAGIC or version != 1:
+        raise ValueError("Not a binary tour file: %s" % in_file)
+    cities = array('i')
+    cities.frombytes(data[BINARY_HEADER.size:BINARY_HEADER.size + 4 * n])
+    if sys.byteorder == "big":
+        cities.byteswap()
+    tour = cities.tolist()
+    return tour + tour[:1], weight
+
+
+def read_tour(in_file):
+    """ This function reads a tour in any format written here
+    :param:
+        in_file (string): Tour file, plain, TSPLIB or binary
+    :return:
+        list, int: closed tour, weight (None for a TSPLIB tour, its cities are node numbers)
+    """
+    with open(in_file, 'rb') as r:
+        head = r.read(4)
+    if head == BINARY_MAGIC:
+        return read_binary_tour(in_file)
+    with open(in_file, 'r') as r:
+        words = r.read().split()
+    if "TOUR_SECTION" in words:
+        tour = []
+        for c in words[words.index("TOUR_SECTION") + 1:]:
+            if c in ("-1", "EOF"):
+                break
+            tour.append(int(c))
+        return tour + tour[:1], None
+    tour = [int(c) for c in words[1:]]
+    return tour + tour[:1], int(words[0])
@@ -1,33 +1,136 @@
 #!/usr/bin/env python3
 from tspSolver import *
-import sys, os
+from distanceTable import throughput
+from lin_kernighan import parallel_lk
+from construction import greedy_edge, mst_tour, hilbert_tour
+from tspIO import iter_instances, read_instances, write_tour, write_tsplib_tour, write_binary_tour
+from instanceCache import InstanceCache
+import profiler
+from budget import Budget
+import sys, os, argparse, tempfile
 from time import perf_counter
 
 
+def parse_args(argv):
+    """ This function parses the command line
+    :param:
+        argv (list): Command line arguments without the program name
+    :return:
+        Namespace: parsed options
+    """
+    parser = argparse.ArgumentParser(description="Solve a tsp instance file")
+    parser.add_argument("file", help="name of the instance file")
+    parser.add_argument("--construct", choices=["nn", "greedy", "mst", "hilbert"], default="nn",
+                        help="start tour: multi-start nearest neighbor, greedy edge, "
+                             "spanning tree with matching or hilbert curve")
+    parser.add_argument("--two-opt", action="store_true",
+                        help="improve the start tour with neighbor list 2-opt")
+    parser.add_argument("--tour-format", choices=["text", "tsplib", "binary"], default=None,
+                        help="output: weight and cities (.tour), TSPLIB (.tour) or compact binary (.btour), "
+                             "default is tsplib for .tsp input and text otherwise")
+    parser.add_argument("--peak-memory", action="store_true",
+                        help="report peak memory allocated while solving")
+    parser.add_argument("--profile", nargs="?", const="-", default=None, metavar="FILE",
+                        help="write a json report of phase times and "
+                             "operation counts to FILE (default: stderr)")
+    parser.add_argument("--profile-memory", action="store_true",
+                        help="add tracemalloc peaks to the --profile report, "
+                             "tracing makes the reported times many times slower")
+    parser.add_argument("--cache", action="store_true",
+                        help="reuse parsed coordinates, distances and candidates from an on-disk cache")
+    parser.add_argument("--cache-dir", default=None,
+                        help="cache directory for --cache (default: .tspcache next to the file)")
+    parser.add_argument("--lk-restarts", type=int, default=0, metavar="N",
+                        help="solve with N parallel random restarts of lin-kernighan")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="worker processes for --lk-restarts (default: all cores)")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="seed of the first lin-kernighan restart")
+    parser.add_argument("--target", type=int, default=None,
+                        help="stop the restarts once a tour this short is found")
+    parser.add_argument("--time-limit", type=float, default=None, metavar="SECONDS",
+                        help="stop solving after this many seconds and keep the best tour so far, "
+                             "Ctrl-C does the same")
+    return parser.parse_args(argv)
+
+
 def main(argv):
     """ Driver function
     :param:
-        argv (list): In file name
+        argv (list): In file name, options
     """
-    path, f_loc = get_path(argv[0])
+    args = parse_args(argv)
+    path, f_loc = get_path(args.file)
     if f_loc is None:
         raise FileNotFoundError("File not found!")
 
-    # Create Distance table
-    lns = process_lines(read_file(f_loc))
-    lkh = lns[0]
-    lkh.find_sets()
-    lkh.init_distance_table()
-    hg = to_solver(lkh)
+    prof = profiler.Profiler(args.profile_memory).start() if args.profile is not None else None
+
+    # Create Distance table, only the first instance of the file is parsed
+    if args.cache:
+        # Loaded from disk when the file content is unchanged
+        with profiler.phase("load_cache"):
+            lkh = next(InstanceCache(args.cache_dir).iter_instances(f_loc), None)
+    else:
+        with profiler.phase("parse"):
+            lkh = next(iter_instances(f_loc), None)
+    if lkh is None:
+        raise ValueError("No instance in file!")
+    # A mapped table gets a name the lk pool workers can open, removed once main is done
+    tmp_dir = tempfile.TemporaryDirectory() if args.lk_restarts > 0 else None
+    if not args.cache:
+        # The find_sets pair list is not read by any solver, only distances and candidates are built.
+        # prepare times them as the distance_table and candidates phases.
+        secs = prepare(lkh, path=os.path.join(tmp_dir.name, "dist.bin") if tmp_dir else None)
+        if secs is not None:
+            print("Distance table:", throughput(lkh.get_length(), secs))
+    profiler.instrument(lkh)
+    with profiler.phase("solver_init"):
+        hg = to_solver(lkh)
 
     # Time algorithm
     t1_start = perf_counter()
-    # Run algorithm
-    tour, weight = hg.run()
+    budget = Budget(args.time_limit)
+    # Run algorithm, a deadline or Ctrl-C ends it with the best tour so far
+    with budget.catch_sigint():
+        if args.lk_restarts > 0:
+            with profiler.phase("lin_kernighan"):
+                tour, weight = parallel_lk(lkh.g, args.lk_restarts, args.workers, args.seed,
+                                           args.target, budget=budget, graph=lkh)
+            # The map stays readable once the name is gone
+            tmp_dir.cleanup()
+            print(weight)
+        elif args.construct != "nn":
+            build = {"greedy": greedy_edge, "mst": mst_tour, "hilbert": hilbert_tour}[args.construct]
+            with profiler.phase("construction"):
+                tour, weight = build(lkh.g, lkh.cand, lkh.dist)
+            if args.two_opt:
+                with profiler.phase("two_opt"):
+                    tour, weight = hg.improve(tour, weight, budget)
+            print(weight)
+        else:
+            with profiler.phase("construction"):
+                tour, weight = hg.run(args.two_opt, args.peak_memory, budget)
+    if budget.expired():
+        print("Stopped early, best tour so far")
     t1_end = perf_counter()
     print("Running time:", (t1_end-t1_start))
-
-    to_file(argv[0]+".tour", tour, weight, path)
+    if args.peak_memory:
+        print("Peak memory:", hg.peak_memory)
+
+    fmt = args.tour_format or ("tsplib" if args.file.lower().endswith(".tsp") else "text")
+    with profiler.phase("to_file"):
+        if fmt == "binary":
+            write_binary_tour(os.path.join(path, args.file+".btour"), tour, weight)
+        elif fmt == "tsplib":
+            # TSPLIB tours list node numbers, the ids of the input file
+            write_tsplib_tour(os.path.join(path, args.file+".tour"), tour, weight,
+                              list(lkh.ids), os.path.splitext(args.file)[0])
+        else:
+            to_file(args.file+".tour", tour, weight, path)
+    if prof is not None:
+        prof.stop()
+        prof.write(args.profile)
 
 
 def get_path(file_name):
@@ -70,28 +173,7 @@ def process_lines(lines):
     :return:
         list: list of distance obj
     """
-
-    test_cases = []
-    curr = 0
-    i = 0
-    while i < len(lines):
-        # k: number of vertices
-        k = int(lines[i])
-
-        g = Distance(k)
-        # loop through ordered pairs and put in graph
-        for k in range(i + 1, k + i + 1):
-            v = lines[k].split()
-            # Add vertex x,y points to graph
-            # Add city id's to dict where coordinates are key
-            s = {int(v[0]): (int(v[1]), int(v[2]))}
-            g.ids.update(s)
-            g.add_vertex(int(v[1]), int(v[2]))
-        # Shift i to move to next graph
-        i = k + 1
-        curr += 1
-        test_cases.append(g)
-    return test_cases
+    return list(read_instances(lines))
 
 
 def to_file(outfile, tour, weight, path):
@@ -107,14 +189,8 @@ def to_file(outfile, tour, weight, path):
     :return:
         file: file output
     """
-    out = os.path.join(path, outfile)
-    with open(out, 'w') as w:
-        w.write(str(weight)+"\n")
-        for i in range(len(tour)-1):
-            w.write(str(tour[i])+"\n")
-        w.close()
+    write_tour(os.path.join(path, outfile), tour, weight)
 
 
 if __name__=="__main__":
-    sys.setrecursionlimit(10400)
     main(sys.argv[1:])
@@ -1,7 +1,14 @@
 #!/usr/bin/env python3
-import math, sys
+import sys
 from euclideanGraph import Graph
-import copy
+from distanceTable import build_distance_table, build_mapped_table, LazyDistance, INF, MATRIX_LIMIT, MAPPED_LIMIT
+from candidateSet import CandidateSet, CANDIDATES
+import localSearch
+import profiler
+from tour import make_tour
+from construction import NearestTree
+from budget import expired
+import tracemalloc
 
 
 class Distance(Graph):
@@ -10,22 +17,83 @@ class Distance(Graph):
         self.dist = [[]]
         self.len_ = 0
         self.path = []
+        self.cand = None
+        # File of a memory-mapped dist, None when it has no name
+        self.dist_path = None
 
     def get_length(self):
         return self._k
 
     # Create a table with all the distances
-    def init_distance_table(self):
-        """ Function to initialize distance table with max int on diagonal
-
+    def init_distance_table(self, as_list=False):
+        """ Function to initialize distance table
+        :param:
+            as_list (bool): Keep the old list of lists table instead of int32 table
+                (default is False)
         :return:
             distance table
         """
-        self.dist = [[0]*self._k for i in range(self._k)]
-        for i in range(0, self._k):
-            for j in range(0, self._k):
-                # Calculate inner product of all combinations of sets
-                self.dist[i][j] = int(round(math.sqrt((self.g[i][0]-self.g[j][0])**2+(self.g[i][1]-self.g[j][1])**2)))
+        self.dist = build_distance_table(self.g, as_list)
+
+    def init_candidates(self, k=CANDIDATES):
+        """ Function to build the k nearest neighbor candidate lists
+        :param:
+            k (int): Number of neighbors per city
+        :return:
+            candidate set
+        """
+        self.cand = CandidateSet(self.g, k)
+
+    def init_lazy_distance(self, cache_size=LazyDistance.CACHE_SIZE):
+        """ Function to use an on demand distance provider instead of a full table
+        :param:
+            cache_size (int): Number of city pairs kept in the LRU cache
+        :return:
+            distance provider
+        """
+        self.dist = LazyDistance(self.g, cache_size)
+
+    def init_mapped_distance(self, path=None):
+        """ Function to build the distance table in a memory-mapped file
+        :param:
+            path (string): Table file
+                (default is None, an unlinked temporary file)
+        :return:
+            float: build seconds
+        """
+        self.dist, secs = build_mapped_table(self.g, path)
+        self.dist_path = path
+        return secs
+
+
+def prepare(g, k=CANDIDATES, path=None):
+    """ Function to build the distances and candidates of a parsed instance.
+        The kind of distances goes by size: computed on demand above MAPPED_LIMIT,
+        a memory-mapped table above MATRIX_LIMIT, else a table in RAM.
+    :param:
+        g (obj): Parsed graph, Distance or LKTsp
+    :param:
+        k (int): Candidate neighbors per city
+            (default is CANDIDATES)
+    :param:
+        path (string): File of a memory-mapped table
+            (default is None, a temporary file)
+    :return:
+        float: build seconds of a memory-mapped table, None for the other kinds
+    """
+    secs = None
+    with profiler.phase("distance_table"):
+        if g.get_length() > MAPPED_LIMIT:
+            # Neither the pair list nor the table fits, compute distances on demand
+            g.init_lazy_distance()
+        elif g.get_length() > MATRIX_LIMIT:
+            # The table fits on disk, the page cache keeps the hot rows in RAM
+            secs = g.init_mapped_distance(path)
+        else:
+            g.init_distance_table()
+    with profiler.phase("candidates"):
+        g.init_candidates(k)
+    return secs
 
 
 def to_solver(obj):
@@ -35,61 +103,96 @@ def to_solver(obj):
     :return:
         obj: solver object
     """
-    return Solver(obj.get_length(), obj.dist)
+    return Solver(obj.get_length(), obj.dist, obj.cand, obj.g)
 
 
 class Solver:
     """
     Solver class. Runs the algorithm to find 2 opt path
     """
-    def __init__(self, k, dist):
+    def __init__(self, k, dist, cand=None, coords=None):
         self._k = k
         self.dist = dist
-        self.zeros = [[0]*self._k for i in range(self._k)]
-        self.lines = [[0]*self._k for i in range(self._k)]
-
-        for i in range(k):
-            for j in range(k):
-                if i == j:
-                    self.dist[i][j] = sys.maxsize
+        self.cand = cand
+        self.coords = coords
+        # Peak bytes allocated by the last run(trace_memory=True)
+        self.peak_memory = 0
 
-    def find_path(self, weight, path, idx, lst):
+    def find_path(self, weight, path, idx, lst, bound=None):
         """ Function to find the shortest path. Greedy algorithm.
+            Iterative nearest neighbor, visited cities are kept in a bitmap. The nearest
+            unvisited one is the first unvisited candidate, else with coordinates
+            it comes from a 2d tree.
+            The weight is summed as the path grows.
         :param:
-            weight (list): List of weights
+            weight (list): List of weights, None to only keep the total
         :param:
             path (list): list of vertices visited
         :param:
             idx (int): Current index
         :param:
             lst (list): List of distances
+        :param:
+            bound (int): Give up once the weight reaches this, the path is then left unfinished
+                (default is None)
         :return:
-            path, weight: path and weight will be optimal found
+            int: weight of the closed path, None if it reached bound
         """
-        if len(path) == self._k:
-            # Add path back to home
-            path.append(path[0])
-            weight.append(lst[path[0]][idx])
-            return
+        visited = bytearray(self._k)
+        tree = NearestTree(self.coords) if self.coords is not None else None
+        for i in path:
+            visited[i] = 1
+            if tree is not None:
+                tree.remove(i)
 
-        lst2 = []
-        for i, ele in enumerate(lst[idx]):
-            if i not in path:
-                lst2.append(ele)
+        total = 0
+        while len(path) < self._k:
+            if tree is not None:
+                nxt = tree.nearest(idx, self.cand)
+                tree.remove(nxt)
             else:
-                lst[idx][i] = sys.maxsize
-                lst2.append(sys.maxsize)
-        m = min(lst2)
-        idx = lst[idx].index(m)
+                nxt = self.next_unvisited(visited, idx, lst)
+            visited[nxt] = 1
+            path.append(nxt)
+            d = int(lst[idx][nxt])
+            total += d
+            if weight is not None:
+                weight.append(d)
+            if bound is not None and total >= bound:
+                return None
+            idx = nxt
+        # Add path back to home
+        path.append(path[0])
+        d = int(lst[path[0]][idx])
+        if weight is not None:
+            weight.append(d)
+        return total + d
 
-        if idx not in path:
-            path.append(idx)
-            weight.append(m)
-            # Call function and swap row/ col
-            self.find_path(weight, path, idx, lst)
+    def next_unvisited(self, visited, idx, lst):
+        """ Function to find the nearest unvisited city without coordinates
+        :param:
+            visited (bytearray): 1 for visited cities
+        :param:
+            idx (int): Current index
+        :param:
+            lst (list): List of distances
+        :return:
+            int: nearest unvisited city
+        """
+        # Candidates are sorted by distance, the first unvisited one wins
+        if self.cand is not None:
+            for i in self.cand.neighbors(idx):
+                if not visited[i]:
+                    return i
+        m, nxt = INF, -1
+        for i, ele in enumerate(lst[idx]):
+            if not visited[i] and (ele < m or nxt == -1):
+                m, nxt = ele, i
+        return nxt
 
     def find_path_itr(self, weight, path, idx, lst):
         """ Function to find the shortest path. Greedy algorithm.
+            Same as find_path, which is iterative now.
         :param:
             weight (list): List of weights
         :param:
@@ -99,55 +202,75 @@ class Solver:
         :param:
             lst (list): List of distances
         :return:
-            path, weight: path and weight will be optimal found
+            int: weight of the closed path
         """
-        # Iterative find path
-        while len(path) < self._k:
-            lst2 = []
-            for i, ele in enumerate(lst[idx]):
-                if i not in path:
-                    lst2.append(ele)
-                else:
-                    lst[idx][i] = sys.maxsize
-                    lst2.append(sys.maxsize)
-            m = min(lst2)
-
-            idx = lst[idx].index(m)
-            if idx not in path:
-                path.append(idx)
-                weight.append(m)
-
-            if len(path) == self._k:
-                # Add path back to home
-                path.append(path[0])
-                weight.append(lst[path[0]][idx])
-                return
-
-    def run(self):
+        return self.find_path(weight, path, idx, lst)
+
+    def improve(self, tour, weight, budget=None):
+        """ This function runs 2-opt with neighbor lists on a closed tour
+        :param:
+            tour (list): Closed tour, first vertex repeated at the end
+        :param:
+            weight (int): Weight of tour
+        :param:
+            budget (Budget): Stop early once expired, with the moves made so far
+                (default is None)
+        :return:
+            list, int: improved closed tour, its weight
+        """
+        if self.cand is None:
+            raise ValueError("2-opt needs candidate lists, call init_candidates first")
+        if not tour:
+            # No cities, nothing to improve
+            return tour, weight
+        t = make_tour(tour[:-1])
+        gain = localSearch.two_opt(t, self.dist, self.cand, budget=budget)
+        path = t.to_list()
+        path.append(path[0])
+        return path, weight - gain
+
+    def run(self, two_opt=False, trace_memory=False, budget=None):
         """ This function runs the algorithm.
+            Every start reads the same distance table, only the current and
+            best tour are kept, so a start costs O(n) extra memory.
+        :param:
+            two_opt (bool): Improve the best greedy tour with 2-opt
+                (default is False)
+        :param:
+            trace_memory (bool): Record peak memory allocated by the starts in self.peak_memory
+                (default is False)
+        :param:
+            budget (Budget): Stop starting new tours once expired, the first start always runs
+                (default is None)
         :return:
             list, int: list of vertices visited in order, Weight of path found.
         """
-        tour = [[] for i in range(self._k)]
-        weight = [[] for i in range(self._k)]
-        weight2 = []
+        # Under a memory profiler tracing is already on, it is left running then
+        started = trace_memory and not tracemalloc.is_tracing()
+        if started:
+            tracemalloc.start()
+        if trace_memory:
+            # Counted from what is allocated now, the peak is not reset under the profiler
+            base = tracemalloc.get_traced_memory()[0]
+        min_tour = []
         min_weight = sys.maxsize
 
         n = self._k if self._k < 300 else 420%69
         for i in range(n):
-            d = copy.deepcopy(self.dist)
-            m = max(self.dist[i])
-            idx = self.dist[i].index(m)
-            tour[i].append(idx)
-            self.find_path(weight[i], tour[i], idx, d)
-
-        min_tour = []
-        for i in range(n):
-            sum_l = sum(weight[i])
-            if sum_l < min_weight:
+            if i > 0 and expired(budget):
+                break
+            tour = [i]
+            # A start that reaches the best weight so far can't win, drop it early
+            sum_l = self.find_path(None, tour, i, self.dist, min_weight)
+            if sum_l is not None and sum_l < min_weight:
                 min_weight = sum_l
-                min_tour = tour[i]
+                min_tour = tour
+
+        if trace_memory:
+            self.peak_memory = tracemalloc.get_traced_memory()[1] - base
+            if started:
+                tracemalloc.stop()
+        if two_opt:
+            min_tour, min_weight = self.improve(min_tour, min_weight, budget)
         print(min_weight)
         return min_tour, min_weight
-
-